@@ -2,84 +2,323 @@ import sys
 import cv2
 import numpy as np
 import requests
-import base64
 import threading
+import os
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.mjpeg import iter_frames
+from shared.frame import Frame
+from shared.preprocess import PreprocessSettings
+from shared.quality import DEFAULT_LADDER, QualityController
+from shared.payload import DEFAULT_MAX_TOKENS, STREAM_DONE, build_vision_payload, build_stream_payload, extract_content, parse_stream_line
+from shared.scene import scene_signature, scene_change
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
     QLineEdit, QTextEdit, QStatusBar, QCheckBox, QSpinBox, QGroupBox, QGridLayout,
-    QFrame, QSplitter
+    QFrame, QSplitter, QDoubleSpinBox
 )
 from PyQt6.QtGui import QImage, QPixmap, QFont, QPalette
-from PyQt6.QtCore import QTimer, Qt, QThread, pyqtSignal
+import time
+from PyQt6.QtCore import QTimer, Qt, QThread, QThreadPool, QRunnable, QObject, QEvent, pyqtSignal
 
-ESP32_URL = "http://192.168.251.53/"
+ESP32_URL = "http://192.168.251.53/"  # or the server's re-broadcast, e.g. "http://<server>:8000/stream"
 BACKEND_URL = "https://8080-01jvyxcckwn7v10c56ara2prnw.cloudspaces.litng.ai"
+STREAM_TIMEOUT = (3, 5)  # connect, read (seconds)
+STREAM_BACKOFF_MAX = 10  # seconds between reconnect attempts, at most
+BACKEND_TIMEOUT = 30
+# Defaults send the camera's JPEG bytes untouched (no re-encode), e.g.
+# PreprocessSettings(max_edge=512, quality=70, grayscale=False, crop=0.8) to shrink payloads
+SEND_PREPROCESS = PreprocessSettings()
+# Step down from SEND_PREPROCESS through smaller images and shorter answers while
+# the p90 backend latency is above the target, and back up when there is headroom
+ADAPTIVE_QUALITY = True
+QUALITY_TARGET = 2.0  # seconds
+QUALITY_LADDER = [(SEND_PREPROCESS, DEFAULT_MAX_TOKENS)] + DEFAULT_LADDER[1:]
+# Requests in flight at once (pipelining depth), adjustable in the UI up to BACKEND_MAX_IN_FLIGHT.
+# Depth > 1 lets auto-send refresh faster than one backend round trip.
+BACKEND_IN_FLIGHT = 2
+BACKEND_MAX_IN_FLIGHT = 4
 DEFAULT_INSTRUCTION = "You are an assistive vision system for the visually impaired. Given an image from a wearable camera, describe the scene in a way that maximizes situational awareness and independence. Clearly identify objects, obstacles, people, and signage. If there is text in the scene, read it aloud and explain its context (e.g., sign, label, document). Use short, direct sentences and avoid technical jargon. Prioritize information that would help a visually impaired user navigate or understand their environment."
 
-def fetch_mjpeg_frame(url):
-    response = requests.get(url, stream=True, timeout=10)
-    bytes_data = bytes()
-    for chunk in response.iter_content(chunk_size=1024):
-        bytes_data += chunk
-        a = bytes_data.find(b'\xff\xd8')
-        b = bytes_data.find(b'\xff\xd9')
-        if a != -1 and b != -1:
-            jpg = bytes_data[a:b+2]
-            bytes_data = bytes_data[b+2:]
-            frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-            yield frame
-
-class BackendThread(QThread):
-    result_signal = pyqtSignal(str)
+# Decode flags by downscale factor; JPEG can decode at 1/2 and 1/4 scale for a fraction of the cost
+DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}
+
+class CaptureThread(QThread):
+    """Owns the MJPEG connection so network stalls never block the GUI thread.
+
+    Only the newest decoded frame is kept: if the GUI has not picked up the
+    previous one yet it is simply replaced, and ``frame_ready`` is emitted
+    once per pickup rather than once per frame. Frames are published as
+    ``(Frame, display_image, scale)``; the display image is decoded at
+    ``1/scale`` size, the full-size image stays available lazily.
+    """
+    frame_ready = pyqtSignal()
+    status_signal = pyqtSignal(str)
+    log_signal = pyqtSignal(str)
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._lock = threading.Lock()
+        self._latest = None
+        self._pending = False
+        self._running = True
+        # Set by stop() to cut a reconnect backoff short
+        self._stopped = threading.Event()
+        self._response = None
+        self.decode_scale = 1
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+    def take_frame(self):
+        with self._lock:
+            frame, self._latest, self._pending = self._latest, None, False
+        return frame
+
+    def _publish(self, frame):
+        with self._lock:
+            if self._latest is not None:
+                self.frames_dropped += 1
+            self._latest = frame
+            notify = not self._pending
+            self._pending = True
+        if notify:
+            self.frame_ready.emit()
+
+    def run(self):
+        backoff = 0.5
+        while self._running:
+            try:
+                self.log_signal.emit(f"📡 Connecting to {self.url}")
+                self._response = requests.get(self.url, stream=True, timeout=STREAM_TIMEOUT)
+                self._response.raise_for_status()
+                self.log_signal.emit("✅ Connected to MJPEG stream.")
+                for jpeg in iter_frames(self._response.iter_content(chunk_size=8192)):
+                    scale = self.decode_scale
+                    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), DECODE_FLAGS[scale])
+                    if image is None:
+                        continue
+                    backoff = 0.5
+                    self.frames_captured += 1
+                    self._publish((Frame(jpeg), image, scale))
+                    if not self._running:
+                        break
+            except Exception as e:
+                if not self._running:
+                    break
+                self.status_signal.emit(f"❌ Stream error: {e}")
+                self.log_signal.emit(f"❌ Stream error: {e} (retrying in {backoff:.1f}s)")
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+            if self._running:
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, STREAM_BACKOFF_MAX)
+
+    def stop(self):
+        """Ask run() to return; it may still be inside a connect attempt (up to STREAM_TIMEOUT)."""
+        self._running = False
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            # Unblocks a pending read in run()
+            response.close()
+
+def create_backend_session(pool_size=BACKEND_MAX_IN_FLIGHT):
+    # One keep-alive session for the app's lifetime so requests skip the TCP+TLS handshake
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+class TimingStats:
+    """Rolling per-stage latencies of recent backend requests, for the timings panel."""
+
+    STAGES = (
+        ("frame_age", "frame age"),
+        ("encode", "encode"),
+        ("queue", "queue wait"),
+        ("backend", "upload+server"),
+        ("download", "download"),
+        ("first_token", "first token"),
+        ("total", "total"),
+    )
+
+    def __init__(self, window=50):
+        self.samples = {stage: deque(maxlen=window) for stage, _ in self.STAGES}
+        self.requests = 0
+        self.errors = 0
+        self.stale = 0
+        self.request_kb = None
+
+    def add(self, timings):
+        self.requests += 1
+        for stage, value in timings.items():
+            if stage in self.samples and value is not None:
+                self.samples[stage].append(value)
+        self.request_kb = timings.get("request_kb", self.request_kb)
+
+    def summary(self):
+        rows = [f"{'stage':<14}{'last':>8}{'p50':>8}{'p95':>8}  (ms)"]
+        for stage, label in self.STAGES:
+            values = self.samples[stage]
+            if not values:
+                rows.append(f"{label:<14}{'–':>8}{'–':>8}{'–':>8}")
+                continue
+            ordered = sorted(values)
+            p50 = ordered[len(ordered) // 2]
+            p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+            rows.append(f"{label:<14}{values[-1]:>8.0f}{p50:>8.0f}{p95:>8.0f}")
+        size = f"{self.request_kb:.0f} KB" if self.request_kb is not None else "–"
+        rows.append(f"requests {self.requests}, errors {self.errors}, stale {self.stale}, last body {size}")
+        return "\n".join(rows)
+
+class BackendSignals(QObject):
+    # (seq, frame timestamp, text); errors arrive here too so they are ordered like results
+    result_signal = pyqtSignal(int, float, str)
+    # (seq, text so far) while tokens stream in
+    partial_signal = pyqtSignal(int, str)
     status_signal = pyqtSignal(str)
     log_signal = pyqtSignal(str)
+    # Per-stage durations in ms (see TimingStats.STAGES) of a successful request
+    timing_signal = pyqtSignal(dict)
+    error_signal = pyqtSignal()
+    finished_signal = pyqtSignal(int)
+
+class BackendJob(QRunnable):
+    """One backend request, run on the window's QThreadPool.
+
+    ``seq`` increases with every request the window sends; together with the
+    frame timestamp it lets the window drop results that complete after a
+    newer one when several requests are in flight.
+    """
 
-    def __init__(self, backend_url, instruction, frame):
+    def __init__(self, seq, backend_url, instruction, frame, session=None, stream=False, quality=None, cancelled=None):
         super().__init__()
+        self.signals = BackendSignals()
+        self.seq = seq
         self.backend_url = backend_url
         self.instruction = instruction
         self.frame = frame
+        self.session = session or requests
+        # Render partial text via partial_signal as tokens arrive
+        self.stream = stream
+        # QualityController picking settings and max_tokens, fed with this request's latency
+        self.quality = quality
+        # threading.Event set when the window closes: skip the request, or stop reading a stream
+        self.cancelled = cancelled or threading.Event()
+        self.queued_at = time.perf_counter()
 
     def run(self):
-        self.status_signal.emit("Encoding image and sending request...")
-        self.log_signal.emit("Encoding image and sending request...")
-        _, buffer = cv2.imencode('.jpg', self.frame)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-        image_data_url = f"data:image/jpeg;base64,{image_base64}"
-
-        payload = {
-            "max_tokens": 100,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "text", "text": self.instruction },
-                        { "type": "image_url", "image_url": { "url": image_data_url } }
-                    ]
-                }
-            ]
-        }
+        try:
+            if not self.cancelled.is_set():
+                self.send()
+        finally:
+            self.signals.finished_signal.emit(self.seq)
+
+    def emit_result(self, text):
+        self.signals.result_signal.emit(self.seq, self.frame.timestamp, text)
+
+    def send(self):
+        self.signals.status_signal.emit("Encoding image and sending request...")
+        self.signals.log_signal.emit(f"#{self.seq} Encoding image and sending request...")
+        settings, max_tokens = self.quality.current if self.quality else (SEND_PREPROCESS, DEFAULT_MAX_TOKENS)
+        # Time spent waiting for a free worker in the pool
+        self.timings = {"frame_age": self.frame.age * 1000, "queue": (time.perf_counter() - self.queued_at) * 1000}
+        encode_start = time.perf_counter()
+        # Cached on the frame, so resending the same frame costs nothing
+        image_data_url = self.frame.encoded_data_url(settings)
+        self.timings["encode"] = (time.perf_counter() - encode_start) * 1000
+        if image_data_url is None:
+            self.emit_result("Could not encode frame.")
+            self.signals.status_signal.emit("Encoding failed.")
+            self.signals.log_signal.emit("Could not encode frame.")
+            return
+        self.signals.log_signal.emit(
+            f"Preprocess {settings.describe()}: {len(self.frame.encode(settings))} bytes JPEG, {len(image_data_url)} bytes base64")
+
+        if self.stream:
+            payload = build_stream_payload(image_data_url, self.instruction, max_tokens)
+        else:
+            payload = build_vision_payload(image_data_url, self.instruction, max_tokens)
         headers = {"Content-Type": "application/json"}
+        if self.cancelled.is_set():
+            return
         try:
-            self.status_signal.emit("Sending request to backend...")
-            self.log_signal.emit("Sending request to backend...")
-            response = requests.post(f"{self.backend_url}/v1/chat/completions", json=payload, headers=headers)
-            self.status_signal.emit("Request sent. Waiting for response...")
-            self.log_signal.emit("Request sent. Waiting for response...")
-            if response.ok:
+            self.signals.status_signal.emit("Sending request to backend...")
+            self.signals.log_signal.emit(f"#{self.seq} Sending request to backend...")
+            start = time.perf_counter()
+            response = self.session.post(f"{self.backend_url}/v1/chat/completions", json=payload, headers=headers,
+                                         timeout=BACKEND_TIMEOUT, stream=self.stream)
+            self.signals.status_signal.emit("Request sent. Waiting for response...")
+            self.signals.log_signal.emit("Request sent. Waiting for response...")
+            # requests' elapsed runs from sending the request to parsing the response headers
+            self.timings["backend"] = response.elapsed.total_seconds() * 1000
+            self.timings["request_kb"] = len(response.request.body or b"") / 1024
+            if response.ok and self.stream:
+                self.read_stream(response, start)
+            elif response.ok:
                 data = response.json()
-                result = data["choices"][0]["message"]["content"]
-                self.result_signal.emit(result)
-                self.status_signal.emit("Backend response received.")
-                self.log_signal.emit("Backend response received.")
+                result = extract_content(data)
+                self.emit_result(result)
+                self.signals.status_signal.emit("Backend response received.")
+                self.signals.log_signal.emit(f"#{self.seq} Backend response received in {(time.perf_counter() - start) * 1000:.0f} ms.")
+                self.record_latency(time.perf_counter() - start)
+                self.timings["total"] = (time.perf_counter() - start) * 1000
+                self.timings["download"] = self.timings["total"] - self.timings["backend"]
+                self.signals.timing_signal.emit(self.timings)
             else:
-                self.result_signal.emit(f"Backend error: {response.status_code} {response.text}")
-                self.status_signal.emit("Backend error.")
-                self.log_signal.emit(f"Backend error: {response.status_code} {response.text}")
+                if response.status_code >= 500:
+                    # Overload counts as a full timeout so the quality controller steps down
+                    self.record_latency(BACKEND_TIMEOUT)
+                self.signals.error_signal.emit()
+                self.emit_result(f"Backend error: {response.status_code} {response.text}")
+                self.signals.status_signal.emit("Backend error.")
+                self.signals.log_signal.emit(f"#{self.seq} Backend error: {response.status_code} {response.text}")
         except Exception as e:
-            self.result_signal.emit(f"Request failed: {e}")
-            self.status_signal.emit("Request failed.")
-            self.log_signal.emit(f"Request failed: {e}")
+            if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                self.record_latency(BACKEND_TIMEOUT)
+            self.signals.error_signal.emit()
+            self.emit_result(f"Request failed: {e}")
+            self.signals.status_signal.emit("Request failed.")
+            self.signals.log_signal.emit(f"#{self.seq} Request failed: {e}")
+
+    def read_stream(self, response, start):
+        parts = []
+        first_token_ms = None
+        with response:
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if self.cancelled.is_set():
+                    return
+                delta = parse_stream_line(line or "")
+                if delta is STREAM_DONE:
+                    break
+                if delta is None:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                    self.signals.status_signal.emit("Receiving response...")
+                parts.append(delta)
+                self.signals.partial_signal.emit(self.seq, "".join(parts))
+        total_ms = (time.perf_counter() - start) * 1000
+        self.emit_result("".join(parts))
+        self.signals.status_signal.emit("Backend response received.")
+        self.signals.log_signal.emit(f"#{self.seq} Backend response streamed: first token {first_token_ms or 0:.0f} ms, total {total_ms:.0f} ms.")
+        self.record_latency(total_ms / 1000)
+        self.timings.update(first_token=first_token_ms, total=total_ms, download=total_ms - self.timings["backend"])
+        self.signals.timing_signal.emit(self.timings)
+
+    def record_latency(self, seconds):
+        if self.quality is None:
+            return
+        level = self.quality.record(seconds)
+        if level is not None:
+            settings, max_tokens = self.quality.current
+            self.signals.log_signal.emit(f"Quality level {level}: {settings.describe()}, max_tokens={max_tokens}")
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -87,25 +326,50 @@ class MainWindow(QWidget):
         self.setWindowTitle("ESP32-CAM AI Assistant")
         self.setGeometry(100, 100, 1200, 800)
         self.setup_styles()
+        self.timing_stats = TimingStats()
         self.setup_ui()
         self.setup_connections()
         
         # Video stream
         self.frame = None
+        self.display_frame = None
         self.stream_thread = None
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.start(30)  # ~30 FPS
+        # Stopped capture threads still finishing a connect attempt
+        self.stopping_threads = set()
+
+        # Rendering: target size is recomputed only when the label or frame size changes
+        self.video_label.installEventFilter(self)
+        self.render_shape = None
+        self.render_size = None
+        self.render_buffer = None
+        self.frames_painted = 0
+        self.stats_time = time.monotonic()
+        self.stats_cpu = time.process_time()
+        self.stats_painted = 0
+        self.stats_captured = 0
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_stats_overlay)
+        self.stats_timer.start(1000)
 
-        # Backend
-        self.backend_thread = None
+        # Backend: a fixed pool of worker threads; results are ordered by request sequence number
+        self.backend_pool = QThreadPool(self)
+        self.backend_pool.setMaxThreadCount(BACKEND_MAX_IN_FLIGHT)
+        self.backend_session = create_backend_session()
+        self.backend_cancelled = threading.Event()
+        self.send_seq = 0
+        self.in_flight = 0
+        self.shown_seq = 0
+        self.shown_frame_time = 0.0
+        self.partial_seq = 0
+        self.quality = QualityController(QUALITY_LADDER, QUALITY_TARGET) if ADAPTIVE_QUALITY else None
 
         # Auto-send
         self.auto_send_timer = QTimer()
         self.auto_send_timer.timeout.connect(self.auto_send_backend)
+        self.last_sent_signature = None
+        self.last_sent_time = 0.0
 
         # Start MJPEG stream in a thread
-        self.mjpeg_gen = None
         self.start_stream()
 
     def setup_styles(self):
@@ -291,6 +555,11 @@ class MainWindow(QWidget):
         self.video_label.setObjectName("videoLabel")
         self.video_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.video_label.setMinimumHeight(300)
+        self.stats_overlay = QLabel("", self.video_label)
+        self.stats_overlay.setStyleSheet(
+            "background-color: rgba(33, 37, 41, 170); color: #f8f9fa; border-radius: 4px; "
+            "padding: 2px 6px; font-family: 'Consolas', 'Monaco', monospace; font-size: 11px;")
+        self.stats_overlay.move(14, 14)
         
         # Controls section
         controls_group = QGroupBox("📋 Control Panel")
@@ -313,9 +582,38 @@ class MainWindow(QWidget):
         self.interval_spinbox.setSuffix(" ms")
         self.interval_spinbox.setMinimumWidth(100)
         
+        depth_label = QLabel("📶 In flight:")
+        self.depth_spinbox = QSpinBox()
+        self.depth_spinbox.setRange(1, BACKEND_MAX_IN_FLIGHT)
+        self.depth_spinbox.setValue(BACKEND_IN_FLIGHT)
+        self.depth_spinbox.setToolTip("Backend requests allowed in flight at once")
+
         auto_send_layout.addWidget(self.auto_send_checkbox)
         auto_send_layout.addWidget(interval_label)
         auto_send_layout.addWidget(self.interval_spinbox)
+        auto_send_layout.addWidget(depth_label)
+        auto_send_layout.addWidget(self.depth_spinbox)
+
+        # Scene-change gating: only auto-send when the view changed or the last result is stale
+        self.scene_change_checkbox = QCheckBox("🎯 On scene change")
+        self.scene_change_checkbox.setChecked(True)
+        self.threshold_spinbox = QDoubleSpinBox()
+        self.threshold_spinbox.setRange(0.5, 50.0)
+        self.threshold_spinbox.setSingleStep(0.5)
+        self.threshold_spinbox.setValue(6.0)
+        self.threshold_spinbox.setSuffix(" %")
+        staleness_label = QLabel("⌛ Max stale:")
+        self.staleness_spinbox = QSpinBox()
+        self.staleness_spinbox.setRange(1, 300)
+        self.staleness_spinbox.setValue(15)
+        self.staleness_spinbox.setSuffix(" s")
+        self.scene_metric_label = QLabel("Δ –")
+
+        auto_send_layout.addWidget(self.scene_change_checkbox)
+        auto_send_layout.addWidget(self.threshold_spinbox)
+        auto_send_layout.addWidget(staleness_label)
+        auto_send_layout.addWidget(self.staleness_spinbox)
+        auto_send_layout.addWidget(self.scene_metric_label)
         auto_send_layout.addStretch()
 
         # Action buttons
@@ -326,10 +624,13 @@ class MainWindow(QWidget):
         self.stop_button.setObjectName("stopButton")
         self.reconnect_button = QPushButton("🔄 Reconnect Stream")
         self.reconnect_button.setObjectName("reconnectButton")
+        self.stream_checkbox = QCheckBox("⚡ Stream tokens")
+        self.stream_checkbox.setChecked(True)
         
         button_layout.addWidget(self.send_button)
         button_layout.addWidget(self.stop_button)
         button_layout.addWidget(self.reconnect_button)
+        button_layout.addWidget(self.stream_checkbox)
 
         # Add to controls layout
         controls_layout.addWidget(instruction_label, 0, 0, 1, 3)
@@ -346,6 +647,16 @@ class MainWindow(QWidget):
         self.response_box.setReadOnly(True)
         self.response_box.setMinimumHeight(120)
         
+        # Backend timings: where each request's time goes (network vs inference)
+        timings_group = QGroupBox("⏱️ Backend Timings")
+        timings_layout = QVBoxLayout()
+        timings_layout.setContentsMargins(12, 16, 12, 8)
+        self.timings_label = QLabel(self.timing_stats.summary())
+        self.timings_label.setObjectName("timingsLabel")
+        self.timings_label.setStyleSheet("font-family: 'Consolas', 'Monaco', monospace; font-size: 11px;")
+        timings_layout.addWidget(self.timings_label)
+        timings_group.setLayout(timings_layout)
+
         # Logs section
         logs_label = QLabel("📊 System Logs:")
         logs_label.setObjectName("sectionLabel")
@@ -362,6 +673,7 @@ class MainWindow(QWidget):
         main_layout.addWidget(controls_group)
         main_layout.addWidget(response_label)
         main_layout.addWidget(self.response_box, stretch=2)
+        main_layout.addWidget(timings_group)
         main_layout.addWidget(logs_label)
         main_layout.addWidget(self.log_box)
         main_layout.addWidget(self.status_bar)
@@ -375,60 +687,142 @@ class MainWindow(QWidget):
         self.auto_send_checkbox.stateChanged.connect(self.toggle_auto_send)
 
     def start_stream(self):
-        def mjpeg_generator():
-            while True:
-                try:
-                    for frame in fetch_mjpeg_frame(ESP32_URL):
-                        yield frame
-                except Exception as e:
-                    self.status_bar.showMessage(f"❌ Stream error: {e}")
-                    self.append_log(f"❌ Stream error: {e}")
-                    yield None
-        self.mjpeg_gen = mjpeg_generator()
+        self.stop_stream()
+        self.stream_thread = CaptureThread(ESP32_URL)
+        self.stream_thread.frame_ready.connect(self.update_frame)
+        self.stream_thread.status_signal.connect(self.status_bar.showMessage)
+        self.stream_thread.log_signal.connect(self.append_log)
+        self.stream_thread.start()
         self.append_log("✅ (Re)started MJPEG stream.")
 
+    def stop_stream(self):
+        thread = self.stream_thread
+        if thread is not None:
+            self.stream_thread = None
+            thread.frame_ready.disconnect(self.update_frame)
+            thread.stop()
+            if thread.isRunning():
+                # Destroying a running QThread aborts the app; hold on to it until run() returns
+                self.stopping_threads.add(thread)
+                thread.finished.connect(lambda: self.stopping_threads.discard(thread))
+
+    def eventFilter(self, obj, event):
+        if obj is self.video_label and event.type() == QEvent.Type.Resize:
+            self.render_shape = None
+        return super().eventFilter(obj, event)
+
+    def update_render_size(self, image, decode_scale):
+        # Fit the frame into the label keeping aspect ratio, and pick the cheapest
+        # decode scale that still covers the target size
+        h, w = image.shape[:2]
+        rect = self.video_label.contentsRect()
+        scale = min(rect.width() / w, rect.height() / h)
+        tw, th = max(1, int(w * scale)), max(1, int(h * scale))
+        self.render_shape = image.shape
+        self.render_size = (tw, th)
+        self.render_buffer = None if (tw, th) == (w, h) else np.empty((th, tw, 3), dtype=np.uint8)
+        full_w, full_h = w * decode_scale, h * decode_scale
+        new_scale = 1
+        for factor in (2, 4):
+            if full_w // factor >= tw and full_h // factor >= th:
+                new_scale = factor
+        self.stream_thread.decode_scale = new_scale
+
     def update_frame(self):
-        try:
-            frame = next(self.mjpeg_gen)
-            if frame is not None:
-                self.frame = frame
-                rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w, ch = rgb_image.shape
-                bytes_per_line = ch * w
-                qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                pixmap = QPixmap.fromImage(qt_image).scaled(
-                    self.video_label.width(), self.video_label.height(), Qt.AspectRatioMode.KeepAspectRatio)
-                self.video_label.setPixmap(pixmap)
-                self.status_bar.showMessage("📹 Streaming from ESP32-CAM...")
-            else:
-                self.status_bar.showMessage("⚠️ No frame received.")
-        except Exception as e:
-            self.status_bar.showMessage(f"❌ Stream error: {e}")
-            self.append_log(f"❌ Stream error: {e}")
+        if self.stream_thread is None:
+            return
+        published = self.stream_thread.take_frame()
+        if published is None:
+            return
+        self.frame, image, decode_scale = published
+        self.display_frame = image
+        if self.render_shape != image.shape:
+            self.update_render_size(image, decode_scale)
+        if self.render_buffer is None:
+            view = image
+        else:
+            interpolation = cv2.INTER_AREA if self.render_size[0] < image.shape[1] else cv2.INTER_LINEAR
+            view = cv2.resize(image, self.render_size, dst=self.render_buffer, interpolation=interpolation)
+        h, w = view.shape[:2]
+        # Wrap the BGR buffer directly; QPixmap.fromImage makes the only copy
+        qt_image = QImage(view.data, w, h, view.strides[0], QImage.Format.Format_BGR888)
+        self.video_label.setPixmap(QPixmap.fromImage(qt_image))
+        self.frames_painted += 1
+        if self.frames_painted == 1:
+            self.status_bar.showMessage("📹 Streaming from ESP32-CAM...")
+
+    def update_stats_overlay(self):
+        now = time.monotonic()
+        cpu = time.process_time()
+        elapsed = max(now - self.stats_time, 1e-6)
+        captured = self.stream_thread.frames_captured if self.stream_thread else 0
+        paint_fps = (self.frames_painted - self.stats_painted) / elapsed
+        capture_fps = max(captured - self.stats_captured, 0) / elapsed
+        cpu_percent = (cpu - self.stats_cpu) / elapsed * 100
+        scale = self.stream_thread.decode_scale if self.stream_thread else 1
+        text = f"paint {paint_fps:.1f} fps | capture {capture_fps:.1f} fps | CPU {cpu_percent:.0f}% | decode 1/{scale}"
+        if self.quality is not None:
+            text += f" | quality {self.quality.level}/{len(self.quality.ladder) - 1}"
+        self.stats_overlay.setText(text)
+        self.stats_overlay.adjustSize()
+        self.stats_time, self.stats_cpu = now, cpu
+        self.stats_painted, self.stats_captured = self.frames_painted, captured
 
     def send_to_backend(self):
         if self.frame is None:
             self.status_bar.showMessage("❌ No frame to send.")
             self.append_log("❌ No frame to send.")
             return
-        # Prevent overlapping backend requests
-        if self.backend_thread and self.backend_thread.isRunning():
-            self.status_bar.showMessage("⏳ Backend request in progress...")
-            self.append_log("⏳ Backend request in progress...")
+        # Bound the pipeline: at most depth_spinbox requests in flight
+        if self.in_flight >= self.depth_spinbox.value():
+            self.status_bar.showMessage(f"⏳ {self.in_flight} backend request(s) in progress...")
+            self.append_log(f"⏳ {self.in_flight} backend request(s) in progress...")
             return
         instruction = self.instruction_input.text()
+        self.send_seq += 1
         self.status_bar.showMessage("🚀 Sending to backend...")
-        self.append_log("🚀 Sending to backend...")
-        self.send_button.setEnabled(False)
-        self.backend_thread = BackendThread(BACKEND_URL, instruction, self.frame)
-        self.backend_thread.result_signal.connect(self.display_response)
-        self.backend_thread.status_signal.connect(self.status_bar.showMessage)
-        self.backend_thread.log_signal.connect(self.append_log)
-        self.backend_thread.finished.connect(lambda: self.send_button.setEnabled(True))
-        self.backend_thread.start()
+        self.append_log(f"🚀 Sending #{self.send_seq} to backend...")
+        self.last_sent_signature = scene_signature(self.display_frame)
+        self.last_sent_time = time.monotonic()
+        job = BackendJob(self.send_seq, BACKEND_URL, instruction, self.frame, self.backend_session,
+                         stream=self.stream_checkbox.isChecked(), quality=self.quality, cancelled=self.backend_cancelled)
+        job.signals.result_signal.connect(self.display_response)
+        job.signals.partial_signal.connect(self.display_partial)
+        job.signals.status_signal.connect(self.status_bar.showMessage)
+        job.signals.log_signal.connect(self.append_log)
+        job.signals.timing_signal.connect(self.update_timings)
+        job.signals.error_signal.connect(self.count_backend_error)
+        job.signals.finished_signal.connect(self.backend_finished)
+        self.in_flight += 1
+        self.update_send_button()
+        self.backend_pool.start(job)
+
+    def backend_finished(self, seq):
+        self.in_flight -= 1
+        self.update_send_button()
+
+    def update_send_button(self):
+        self.send_button.setEnabled(not self.auto_send_checkbox.isChecked() and self.in_flight < self.depth_spinbox.value())
 
     def auto_send_backend(self):
-        self.send_to_backend()
+        if not self.scene_change_checkbox.isChecked():
+            self.send_to_backend()
+            return
+        if self.frame is None or self.in_flight >= self.depth_spinbox.value():
+            return
+        threshold = self.threshold_spinbox.value()
+        if self.last_sent_signature is None:
+            change = None
+        else:
+            change = scene_change(scene_signature(self.display_frame), self.last_sent_signature)
+        stale = time.monotonic() - self.last_sent_time >= self.staleness_spinbox.value()
+        self.scene_metric_label.setText("Δ –" if change is None else f"Δ {change:.1f}% / {threshold:.1f}%")
+        if change is None or change >= threshold:
+            self.append_log(f"🎯 Scene changed ({'first frame' if change is None else f'{change:.1f}%'}), sending.")
+            self.send_to_backend()
+        elif stale:
+            self.append_log("⌛ Scene unchanged but result is stale, sending.")
+            self.send_to_backend()
 
     def toggle_auto_send(self, state):
         if self.auto_send_checkbox.isChecked():
@@ -439,14 +833,14 @@ class MainWindow(QWidget):
             self.append_log("🔄 Auto-send enabled.")
         else:
             self.auto_send_timer.stop()
-            self.send_button.setEnabled(True)
+            self.update_send_button()
             self.status_bar.showMessage("⏹️ Auto-send disabled.")
             self.append_log("⏹️ Auto-send disabled.")
 
     def stop_all(self):
         self.auto_send_timer.stop()
-        self.send_button.setEnabled(True)
         self.auto_send_checkbox.setChecked(False)
+        self.update_send_button()
         self.status_bar.showMessage("⏹️ Stopped all backend requests and auto-send.")
         self.append_log("⏹️ Stopped all backend requests and auto-send.")
 
@@ -455,13 +849,48 @@ class MainWindow(QWidget):
         self.status_bar.showMessage("🔄 Reconnected to ESP32-CAM stream.")
         self.append_log("🔄 Reconnected to ESP32-CAM stream.")
 
-    def display_response(self, text):
-        self.response_box.setPlainText(text)
-        self.append_log(f"🤖 Backend response: {text}")
+    def update_timings(self, timings):
+        self.timing_stats.add(timings)
+        self.timings_label.setText(self.timing_stats.summary())
+
+    def count_backend_error(self):
+        self.timing_stats.errors += 1
+        self.timings_label.setText(self.timing_stats.summary())
+
+    def display_partial(self, seq, text):
+        # Stream only the newest request still in flight; older ones finish silently
+        if seq > self.shown_seq and seq >= self.partial_seq:
+            self.partial_seq = seq
+            self.response_box.setPlainText(text)
+
+    def display_response(self, seq, frame_time, text):
+        if seq < self.shown_seq or frame_time < self.shown_frame_time:
+            self.timing_stats.stale += 1
+            self.timings_label.setText(self.timing_stats.summary())
+            self.append_log(f"🗑️ Discarded stale result #{seq} (showing #{self.shown_seq}).")
+            return
+        self.shown_seq = seq
+        self.shown_frame_time = frame_time
+        # A newer request already streaming keeps the box; this result is only logged
+        if self.partial_seq <= seq:
+            self.response_box.setPlainText(text)
+        self.append_log(f"🤖 Backend response #{seq}: {text}")
 
     def append_log(self, message):
         self.log_box.append(message)
 
+    def closeEvent(self, event):
+        self.stop_stream()
+        for thread in list(self.stopping_threads):
+            thread.wait()
+        # Queued jobs are dropped and running ones return at their next check; a
+        # non-streamed request already waiting on the backend still ends within BACKEND_TIMEOUT
+        self.backend_cancelled.set()
+        self.backend_pool.clear()
+        self.backend_pool.waitForDone()
+        self.backend_session.close()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+from loguru import logger
+
+from metrics import Counter, Histogram, SIZE_BUCKETS
+
+BACKEND_QUEUE_WAIT = Histogram("inteligaze_backend_queue_wait_seconds", "Time waiting for a free in-flight slot", ["backend"])
+BACKEND_PHASE = Histogram(
+    "inteligaze_backend_phase_seconds",
+    "Backend round trip by phase: connect, upload (request sent), server (body sent to headers "
+    "received, i.e. inference), download (response body)",
+    ["backend", "phase"],
+)
+BACKEND_REQUEST_BYTES = Histogram("inteligaze_backend_request_bytes", "Size of request bodies sent to the backend", ["backend"], SIZE_BUCKETS)
+BACKEND_RESPONSES = Counter("inteligaze_backend_responses_total", "Backend responses by HTTP status", ["backend", "status"])
+
+# (phase, start event, end event) from httpcore's trace extension
+_PHASES = (
+    ("connect", "connect_tcp.started", ("start_tls.complete", "connect_tcp.complete")),
+    ("upload", "send_request_headers.started", ("send_request_body.complete",)),
+    ("server", "send_request_body.complete", ("receive_response_headers.complete",)),
+    ("download", "receive_response_headers.complete", ("receive_response_body.complete",)),
+)
+
+
+class _PhaseTrace:
+    """Collects httpcore trace timestamps for one request."""
+
+    def __init__(self):
+        self.marks = {}
+
+    async def __call__(self, event: str, info: dict):
+        # Events are prefixed with their layer ("connection.", "http11.", "http2."); strip it
+        self.marks[event.partition(".")[2]] = time.perf_counter()
+
+    def observe(self, url: str):
+        for phase, start_event, end_events in _PHASES:
+            start = self.marks.get(start_event)
+            end = next((self.marks[e] for e in end_events if e in self.marks), None)
+            if start is not None and end is not None:
+                BACKEND_PHASE.labels(url, phase).observe(end - start)
+
+
+class BackendBusyError(Exception):
+    """Raised when a request waited too long for a free in-flight slot."""
+
+
+class BackendClient:
+    """Shared, pooled HTTP client for the OpenAI-compatible AI backend.
+
+    One instance lives for the whole app: it is opened on startup and closed on
+    shutdown, so requests reuse keep-alive connections instead of paying a new
+    TCP+TLS handshake each time. At most ``max_in_flight`` requests are sent
+    concurrently; the rest queue for up to ``queue_timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 30.0,
+        http2: bool = False,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        max_in_flight: int = 8,
+        queue_timeout: float = 10.0,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def start(self):
+        if self._client is not None:
+            return
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1.")
+                http2 = False
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits, http2=http2)
+        logger.info(f"AI backend client ready (http2={http2}, max_in_flight={self.max_in_flight}).")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("AI backend client closed.")
+
+    async def _acquire(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise BackendBusyError(f"AI backend busy: {self.in_flight} requests in flight")
+        finally:
+            BACKEND_QUEUE_WAIT.labels(self.url).observe(time.perf_counter() - start)
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def post(self, payload: dict) -> httpx.Response:
+        if self._client is None:
+            await self.start()
+        await self._acquire()
+        trace = _PhaseTrace()
+        try:
+            resp = await self._client.post(self.url, content=self._encode(payload),
+                                           headers={"Content-Type": "application/json"}, extensions={"trace": trace})
+        finally:
+            self._release()
+        trace.observe(self.url)
+        BACKEND_RESPONSES.labels(self.url, resp.status_code).inc()
+        return resp
+
+    def _encode(self, payload: dict) -> bytes:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+        BACKEND_REQUEST_BYTES.labels(self.url).observe(len(body))
+        return body
+
+    @asynccontextmanager
+    async def stream(self, payload: dict) -> AsyncIterator[httpx.Response]:
+        """POST ``payload`` and yield the response with its body still streaming.
+
+        Leaving the block closes the response; if the caller was cancelled
+        (e.g. the client disconnected) that aborts the backend request too.
+        """
+        if self._client is None:
+            await self.start()
+        await self._acquire()
+        trace = _PhaseTrace()
+        try:
+            async with self._client.stream("POST", self.url, content=self._encode(payload),
+                                           headers={"Content-Type": "application/json"}, extensions={"trace": trace}) as resp:
+                BACKEND_RESPONSES.labels(self.url, resp.status_code).inc()
+                yield resp
+        finally:
+            self._release()
+            trace.observe(self.url)
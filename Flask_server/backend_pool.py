@@ -0,0 +1,281 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+import httpx
+from loguru import logger
+
+from backend_client import BackendClient, BackendBusyError
+from metrics import Counter
+
+BACKEND_HEDGED = Counter("inteligaze_backend_hedged_requests_total", "Requests duplicated to a second backend")
+
+
+class NoBackendAvailableError(Exception):
+    """Raised when every backend's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures.
+
+    After ``cooldown`` seconds one half-open probe is let through: success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    @property
+    def available(self) -> bool:
+        """Whether ``allow`` could let a request through, without claiming the probe."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not self._probe_in_flight
+
+    def release_probe(self):
+        """Give back a probe that ended without a verdict (cancelled or never sent)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Latencies (seconds) of the last ``size`` successful requests."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Backend:
+    def __init__(self, client: BackendClient, weight: float, breaker: CircuitBreaker):
+        self.client = client
+        self.weight = weight
+        self.breaker = breaker
+        self.latency = LatencyWindow()
+        self.requests = 0
+        self.errors = 0
+        self.hedges_won = 0
+
+    @property
+    def url(self) -> str:
+        return self.client.url
+
+    def record(self, ok: bool, seconds: float):
+        self.requests += 1
+        if ok:
+            self.latency.add(seconds)
+            self.breaker.record_success()
+        else:
+            self.errors += 1
+            self.breaker.record_failure()
+
+    def stats(self) -> dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "weight": self.weight,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.client.in_flight,
+            "hedges_won": self.hedges_won,
+            "p50_ms": ms(self.latency.percentile(0.5)),
+            "p95_ms": ms(self.latency.percentile(0.95)),
+            "p99_ms": ms(self.latency.percentile(0.99)),
+        }
+
+
+class BackendPool:
+    """Weighted set of AI backends with hedged requests and circuit breaking.
+
+    ``post`` sends to a backend picked by weight among those whose breaker
+    allows traffic. If no answer arrives within that backend's learned p95
+    latency (never less than ``hedge_min_delay``), a duplicate goes to a
+    second backend; the first good response wins and the loser is cancelled.
+    A primary that fails outright is retried once on another backend.
+    Connection errors, timeouts and 5xx responses count as failures.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Tuple[str, float]],
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.5,
+        hedge_initial_delay: float = 2.0,
+        failure_threshold: int = 3,
+        cooldown: float = 15.0,
+        **client_kwargs,
+    ):
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_initial_delay = hedge_initial_delay
+        self.backends: List[Backend] = [
+            Backend(BackendClient(url, **client_kwargs), weight, CircuitBreaker(failure_threshold, cooldown))
+            for url, weight in backends
+        ]
+        self.hedged = 0
+
+    async def start(self):
+        for backend in self.backends:
+            await backend.client.start()
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.client.close()
+
+    def _pick(self, exclude: Optional[Backend] = None) -> Optional[Backend]:
+        candidates = [b for b in self.backends if b is not exclude and b.weight > 0]
+        random.shuffle(candidates)
+        candidates.sort(key=lambda b: random.random() ** (1.0 / b.weight), reverse=True)
+        for backend in candidates:
+            if backend.breaker.allow():
+                return backend
+        return None
+
+    def _hedge_delay(self, backend: Backend) -> float:
+        if len(backend.latency) < 20:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, backend.latency.percentile(self.hedge_percentile))
+
+    async def _attempt(self, backend: Backend, payload: dict) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            resp = await backend.client.post(payload)
+        except (BackendBusyError, asyncio.CancelledError):
+            # A full queue or a lost hedge race says nothing about the backend's health
+            backend.breaker.release_probe()
+            raise
+        except Exception:
+            backend.record(False, time.perf_counter() - start)
+            raise
+        if resp.status_code >= 500:
+            backend.record(False, time.perf_counter() - start)
+            resp.raise_for_status()
+        backend.record(True, time.perf_counter() - start)
+        return resp
+
+    async def post(self, payload: dict) -> httpx.Response:
+        primary = self._pick()
+        if primary is None:
+            raise NoBackendAvailableError("All AI backends are unavailable (circuit open)")
+        tasks = {asyncio.create_task(self._attempt(primary, payload)): primary}
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        hedge_at = None
+        # With no other backend that could take it, a hedge would only wake the loop for nothing
+        if self.hedge and any(b is not primary and b.weight > 0 and b.breaker.available for b in self.backends):
+            hedge_at = time.monotonic() + self._hedge_delay(primary)
+        hedged = False
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None and len(tasks) == 1:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            tasks[task].hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+                # Hedge a slow primary, or fail over once if it errored outright
+                if len(tasks) == 1 and (not done or not pending):
+                    # At most one hedge or failover per request
+                    hedge_at = None
+                    secondary = self._pick(exclude=primary)
+                    if secondary is not None:
+                        if not done:
+                            hedged = True
+                            self.hedged += 1
+                            BACKEND_HEDGED.inc()
+                            logger.info(f"Hedging request to {secondary.url}; no reply from {primary.url} yet")
+                        else:
+                            logger.warning(f"Retrying on {secondary.url} after {primary.url} failed: {error!r}")
+                        task = asyncio.create_task(self._attempt(secondary, payload))
+                        tasks[task] = secondary
+                        pending.add(task)
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    # The loser may still end in an error while it unwinds; don't log it as unretrieved
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    @asynccontextmanager
+    async def stream(self, payload: dict) -> AsyncIterator[httpx.Response]:
+        # Streams are not hedged: once tokens flow the caller is committed to one backend
+        backend = self._pick()
+        if backend is None:
+            raise NoBackendAvailableError("All AI backends are unavailable (circuit open)")
+        start = time.perf_counter()
+        recorded = False
+        try:
+            async with backend.client.stream(payload) as resp:
+                ok = resp.status_code < 500
+                # Time to headers, comparable with post() latencies
+                elapsed = time.perf_counter() - start
+                yield resp
+            # Judged once the body is read: a stream can still break after good headers
+            backend.record(ok, elapsed)
+            recorded = True
+        except httpx.TransportError:
+            backend.record(False, time.perf_counter() - start)
+            recorded = True
+            raise
+        finally:
+            if not recorded:
+                # Busy, client disconnected or the caller gave up: no verdict on the backend
+                backend.breaker.release_probe()
+
+    def stats(self) -> dict:
+        return {"hedged": self.hedged, "backends": {b.url: b.stats() for b in self.backends}}
@@ -0,0 +1,215 @@
+"""Caption recorded frames offline with the same payloads /vision sends.
+
+Reads frames from a directory of images, an MJPEG dump (e.g. saved from the
+ESP32 or from /stream) or a video file, optionally keeping only every Nth
+frame, and writes one JSON line per frame to the output file as results
+arrive. Re-running with the same output skips frames that already have a
+response, so an interrupted run resumes where it stopped.
+
+    python batch_caption.py recordings/walk.mp4 -o walk.jsonl --every 15 --concurrency 8
+    python batch_caption.py frames/ -o frames.jsonl --instruction "Is the path clear?"
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Iterator, NamedTuple, Optional
+
+from loguru import logger
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.frame import Frame
+from shared.mjpeg import iter_frames
+from shared.payload import DEFAULT_MAX_TOKENS, build_vision_payload, extract_content
+from shared.preprocess import PreprocessSettings
+from config import AI_BACKEND_URL, AI_BACKEND_TIMEOUT, OPTIMIZED_PROMPT, PREPROCESS
+from backend_client import BackendClient
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+MJPEG_EXTENSIONS = (".mjpeg", ".mjpg", ".mjp")
+READ_CHUNK = 256 * 1024
+
+
+class BatchItem(NamedTuple):
+    id: str
+    index: int
+    jpeg: bytes
+    position_ms: Optional[float] = None
+
+
+def _to_jpeg(image) -> Optional[bytes]:
+    import cv2
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return buf.tobytes() if ok else None
+
+
+def iter_directory(path: str, every: int) -> Iterator[BatchItem]:
+    import cv2
+    import numpy as np
+    names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+    for index, name in enumerate(names):
+        if index % every:
+            continue
+        with open(os.path.join(path, name), "rb") as f:
+            data = f.read()
+        if not name.lower().endswith((".jpg", ".jpeg")):
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            data = _to_jpeg(image) if image is not None else None
+            if data is None:
+                logger.warning(f"Skipping unreadable image {name}")
+                continue
+        yield BatchItem(name, index, data)
+
+
+def iter_mjpeg(path: str, every: int) -> Iterator[BatchItem]:
+    name = os.path.basename(path)
+
+    def chunks():
+        with open(path, "rb") as f:
+            while chunk := f.read(READ_CHUNK):
+                yield chunk
+
+    for index, jpeg in enumerate(iter_frames(chunks())):
+        if index % every == 0:
+            yield BatchItem(f"{name}#{index}", index, bytes(jpeg))
+
+
+def iter_video(path: str, every: int) -> Iterator[BatchItem]:
+    import cv2
+    name = os.path.basename(path)
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    try:
+        index = 0
+        while True:
+            # grab() skips decoding frames we don't keep
+            if not capture.grab():
+                break
+            if index % every == 0:
+                ok, image = capture.retrieve()
+                jpeg = _to_jpeg(image) if ok else None
+                if jpeg is not None:
+                    yield BatchItem(f"{name}#{index}", index, jpeg, capture.get(cv2.CAP_PROP_POS_MSEC))
+            index += 1
+    finally:
+        capture.release()
+
+
+def open_source(path: str, every: int) -> Iterator[BatchItem]:
+    if os.path.isdir(path):
+        return iter_directory(path, every)
+    if path.lower().endswith(MJPEG_EXTENSIONS):
+        return iter_mjpeg(path, every)
+    return iter_video(path, every)
+
+
+def load_done(output: str) -> set:
+    """IDs that already have a response in ``output``; failed frames are retried."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line cut off by an interruption
+            if "response" in record:
+                done.add(record["id"])
+    return done
+
+
+async def caption(client: BackendClient, item: BatchItem, instruction: str, max_tokens: int,
+                  settings: PreprocessSettings) -> dict:
+    record = {"id": item.id, "index": item.index}
+    if item.position_ms is not None:
+        record["position_ms"] = round(item.position_ms, 1)
+    start = time.perf_counter()
+    try:
+        frame = Frame(item.jpeg)
+        image_data_url = await asyncio.to_thread(frame.encoded_data_url, settings)
+        if image_data_url is None:
+            raise ValueError("Could not preprocess frame")
+        resp = await client.post(build_vision_payload(image_data_url, instruction, max_tokens))
+        resp.raise_for_status()
+        record["response"] = extract_content(resp.json())
+    except Exception as e:
+        record["error"] = str(e) or type(e).__name__
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+async def run(args):
+    settings = PreprocessSettings.from_dict(json.loads(args.preprocess)) if args.preprocess else PREPROCESS
+    done = load_done(args.output)
+    if done:
+        logger.info(f"Resuming: {len(done)} frame(s) in {args.output} already captioned.")
+    client = BackendClient(args.backend, timeout=args.timeout, max_connections=args.concurrency,
+                           max_keepalive=args.concurrency, max_in_flight=args.concurrency,
+                           queue_timeout=args.timeout)
+    await client.start()
+    # Bounded so a fast reader never holds more than a few frames per worker in memory
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    async def produce():
+        source = open_source(args.source, args.every)
+        while True:
+            item = await asyncio.to_thread(next, source, None)
+            if item is None:
+                break
+            if item.id in done:
+                counts["skipped"] += 1
+                continue
+            await queue.put(item)
+        for _ in range(args.concurrency):
+            await queue.put(None)
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        async def work():
+            while (item := await queue.get()) is not None:
+                record = await caption(client, item, args.instruction, args.max_tokens, settings)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                counts["error" if "error" in record else "ok"] += 1
+                processed = counts["ok"] + counts["error"]
+                if processed % args.progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"{processed} frame(s) captioned, {counts['error']} error(s), {processed / elapsed:.2f} frames/s")
+
+        try:
+            await asyncio.gather(produce(), *(work() for _ in range(args.concurrency)))
+        finally:
+            await client.close()
+    elapsed = time.perf_counter() - start
+    processed = counts["ok"] + counts["error"]
+    logger.info(f"Done: {counts['ok']} captioned, {counts['error']} failed, {counts['skipped']} already done; "
+                f"{processed} frame(s) in {elapsed:.1f}s = {processed / elapsed if elapsed else 0:.2f} frames/s")
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("source", help="image directory, MJPEG dump (.mjpeg/.mjpg) or video file")
+    ap.add_argument("-o", "--output", required=True, help="JSONL file to append results to (also used to resume)")
+    ap.add_argument("--every", type=int, default=1, help="caption every Nth frame")
+    ap.add_argument("--concurrency", type=int, default=4, help="backend requests in flight")
+    ap.add_argument("--instruction", default=OPTIMIZED_PROMPT)
+    ap.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    ap.add_argument("--preprocess", help='JSON PreprocessSettings, e.g. \'{"max_edge": 512, "quality": 70}\'')
+    ap.add_argument("--backend", default=AI_BACKEND_URL, help="OpenAI-compatible chat completions URL")
+    ap.add_argument("--timeout", type=float, default=AI_BACKEND_TIMEOUT)
+    ap.add_argument("--progress-every", type=int, default=50)
+    args = ap.parse_args()
+    if args.every < 1 or args.concurrency < 1 or args.progress_every < 1:
+        ap.error("--every, --concurrency and --progress-every must be at least 1")
+    counts = asyncio.run(run(args))
+    sys.exit(1 if counts["error"] else 0)
+
+
+if __name__ == "__main__":
+    main()
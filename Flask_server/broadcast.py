@@ -0,0 +1,49 @@
+import asyncio
+from typing import Set
+
+from loguru import logger
+
+
+class Subscriber:
+    """Per-client frame queue that drops the oldest frame when the reader lags."""
+
+    def __init__(self, maxsize: int = 2):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, frame):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class FrameBroadcaster:
+    """Fans ingested frames (or any other messages) out to any number of subscribers.
+
+    The producer calls ``publish`` on the event loop; each subscriber has its
+    own bounded queue, so one slow viewer never delays the others or ingest.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, maxsize: int = 2) -> Subscriber:
+        sub = Subscriber(maxsize)
+        self._subscribers.add(sub)
+        logger.info(f"Subscriber added ({len(self._subscribers)} total).")
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+        logger.info(f"Subscriber removed ({len(self._subscribers)} total, {sub.dropped} frames dropped).")
+
+    def publish(self, frame):
+        for sub in self._subscribers:
+            sub.offer(frame)
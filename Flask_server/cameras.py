@@ -0,0 +1,279 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+from shared.mjpeg import MJPEGParser
+from shared.frame import Frame, is_complete_jpeg
+from broadcast import FrameBroadcaster
+from frame_ring import FrameRing
+from metrics import Counter, Histogram, SIZE_BUCKETS
+from recorder import REPLAY_SCHEME, run_replay
+from shm_store import ShmFrameReader, segment_name
+
+SHM_POLL_INTERVAL = 0.005  # seconds between checks for a new frame in shared memory
+SHM_REATTACH_AFTER = 5.0  # reattach if no new frame for this long (ingest process may have restarted)
+
+
+INGEST_FRAMES = Counter("inteligaze_ingest_frames_total", "Frames ingested", ["camera"])
+INGEST_DROPPED = Counter("inteligaze_ingest_frames_dropped_total", "Truncated frames dropped at ingest", ["camera"])
+INGEST_RECONNECTS = Counter("inteligaze_ingest_reconnects_total", "Stream reconnect attempts", ["camera"])
+INGEST_FRAME_BYTES = Histogram("inteligaze_ingest_frame_bytes", "Size of ingested JPEG frames", ["camera"], SIZE_BUCKETS)
+INGEST_FRAME_INTERVAL = Histogram("inteligaze_ingest_frame_interval_seconds", "Time between consecutive frames", ["camera"])
+INGEST_PARSE = Histogram("inteligaze_ingest_parse_seconds", "Time to split one network chunk into frames", ["camera"])
+INGEST_PUBLISH = Histogram("inteligaze_ingest_publish_seconds", "Time to hand one frame to subscribers and sinks", ["camera"])
+
+
+class UnknownCameraError(KeyError):
+    pass
+
+
+class Camera:
+    """One MJPEG source: its ingest task, latest-frame slot and subscribers.
+
+    Frames come either straight from the camera over HTTP or, when
+    ``shm_name`` is set, from a shared-memory ring filled by a separate
+    ingest process (see shm_ingest.py). A ``replay://`` URL plays back a
+    recording made by recorder.py instead of connecting to an ESP32.
+    """
+
+    def __init__(self, camera_id: str, url: str, backoff_initial: float = 0.5, backoff_max: float = 30.0,
+                 shm_name: Optional[str] = None, ring_size: int = 16):
+        self.id = camera_id
+        self.url = url
+        self.shm_name = shm_name
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.latest_frame: Optional[Frame] = None
+        # Recent history, e.g. to pick the sharpest of the last few frames
+        self.ring = FrameRing(ring_size)
+        self.frame_seq = 0
+        self.connected = False
+        self.reconnects = 0
+        self.broadcaster = FrameBroadcaster()
+        # Extra consumers called with every ingested frame (e.g. the shared-memory writer)
+        self.sinks: List[Callable[[Frame], None]] = []
+        self.task: Optional[asyncio.Task] = None
+        # Set (and replaced) by ingest when a request is waiting for the next frame
+        self._frame_event: Optional[asyncio.Event] = None
+        # Metric children resolved once; the hot path only adds to them
+        self._m_frames = INGEST_FRAMES.labels(camera_id)
+        self._m_dropped = INGEST_DROPPED.labels(camera_id)
+        self._m_reconnects = INGEST_RECONNECTS.labels(camera_id)
+        self._m_bytes = INGEST_FRAME_BYTES.labels(camera_id)
+        self._m_interval = INGEST_FRAME_INTERVAL.labels(camera_id)
+        self._m_parse = INGEST_PARSE.labels(camera_id)
+        self._m_publish = INGEST_PUBLISH.labels(camera_id)
+
+    @property
+    def latest_frame_time(self) -> Optional[float]:
+        return self.latest_frame.timestamp if self.latest_frame is not None else None
+
+    def is_live(self, max_age: float = 10) -> bool:
+        # Consider the camera connected if a frame arrived in the last max_age seconds
+        return self.latest_frame is not None and self.latest_frame.age < max_age
+
+    def ingest(self, jpeg, timestamp: Optional[float] = None) -> Optional[Frame]:
+        # Only a marker check here; pixels are decoded lazily if a consumer needs them
+        if not is_complete_jpeg(jpeg):
+            logger.warning(f"[{self.id}] Dropping truncated frame ({len(jpeg)} bytes)")
+            self._m_dropped.inc()
+            return None
+        start = time.perf_counter()
+        previous = self.latest_frame
+        self.frame_seq += 1
+        frame = Frame(jpeg, timestamp, seq=self.frame_seq)
+        self.latest_frame = frame
+        self.ring.push(frame)
+        self.broadcaster.publish(frame)
+        for sink in self.sinks:
+            sink(frame)
+        if self._frame_event is not None:
+            self._frame_event.set()
+            self._frame_event = None
+        self._m_publish.observe(time.perf_counter() - start)
+        self._m_frames.inc()
+        self._m_bytes.observe(len(jpeg))
+        if previous is not None:
+            self._m_interval.observe(frame.timestamp - previous.timestamp)
+        return frame
+
+    async def fresh_frame(self, max_age: Optional[float] = None, timeout: float = 0.0) -> Optional[Frame]:
+        """The latest frame if it is at most ``max_age`` seconds old, otherwise
+        the next one ingested within ``timeout`` seconds; None if none arrives."""
+        frame = self.latest_frame
+        if frame is not None and (max_age is None or frame.age <= max_age):
+            return frame
+        if timeout <= 0:
+            return None
+        seen = self.frame_seq
+        if self._frame_event is None:
+            self._frame_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._frame_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        # Any frame ingested since we started waiting is the freshest there is
+        frame = self.latest_frame
+        return frame if frame is not None and frame.seq > seen else None
+
+    async def run(self, client: httpx.AsyncClient):
+        if self.shm_name is not None:
+            await self._run_shm()
+        elif self.url.startswith(REPLAY_SCHEME):
+            await self._run_replay()
+        else:
+            await self._run_http(client)
+
+    async def _run_shm(self):
+        backoff = self.backoff_initial
+        reader = None
+        last_seq = 0
+        last_new = time.monotonic()
+        while True:
+            try:
+                if reader is None:
+                    reader = ShmFrameReader(self.shm_name)
+                    logger.info(f"[{self.id}] Reading frames from shared memory {self.shm_name}")
+                    self.connected = True
+                    last_seq = 0
+                    last_new = time.monotonic()
+                latest = reader.read_latest(last_seq)
+                if latest is not None:
+                    last_seq, timestamp, jpeg = latest
+                    last_new = time.monotonic()
+                    backoff = self.backoff_initial
+                    self.ingest(jpeg, timestamp)
+                elif time.monotonic() - last_new > SHM_REATTACH_AFTER:
+                    # A restarted writer creates a fresh segment; the old mapping never updates
+                    reader.close()
+                    reader = None
+                    self.connected = False
+                    self.reconnects += 1
+                    self._m_reconnects.inc()
+                    continue
+                await asyncio.sleep(SHM_POLL_INTERVAL)
+            except asyncio.CancelledError:
+                if reader is not None:
+                    reader.close()
+                raise
+            except (FileNotFoundError, ValueError) as e:
+                logger.warning(f"[{self.id}] Shared memory {self.shm_name} not available ({e!r}); is shm_ingest.py running?")
+                self.connected = False
+                self.reconnects += 1
+                self._m_reconnects.inc()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+
+    async def _run_replay(self):
+        backoff = self.backoff_initial
+        while True:
+            try:
+                await run_replay(self, self.url)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. the recording directory is missing or still empty
+                logger.error(f"[{self.id}] Replay of {self.url} failed: {e!r}")
+            self.reconnects += 1
+            self._m_reconnects.inc()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    async def _run_http(self, client: httpx.AsyncClient):
+        backoff = self.backoff_initial
+        while True:
+            try:
+                logger.info(f"[{self.id}] Connecting to ESP32 stream at {self.url}")
+                async with client.stream("GET", self.url) as resp:
+                    if resp.status_code != 200:
+                        logger.error(f"[{self.id}] ESP32 stream returned status {resp.status_code}")
+                    else:
+                        logger.info(f"[{self.id}] Connected to ESP32 stream.")
+                        self.connected = True
+                        parser = MJPEGParser()
+                        async for chunk in resp.aiter_bytes():
+                            start = time.perf_counter()
+                            frames = parser.feed(chunk)
+                            self._m_parse.observe(time.perf_counter() - start)
+                            for jpeg in frames:
+                                if self.ingest(jpeg) is not None:
+                                    backoff = self.backoff_initial
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{self.id}] ESP32 stream connection error: {e!r}")
+            finally:
+                self.connected = False
+            self.reconnects += 1
+            self._m_reconnects.inc()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "connected": self.is_live(),
+            "streaming": self.connected,
+            "frame_seq": self.frame_seq,
+            "frame_age": round(self.latest_frame.age, 3) if self.latest_frame is not None else None,
+            "reconnects": self.reconnects,
+            "stream_subscribers": len(self.broadcaster),
+        }
+
+
+class CameraRegistry:
+    """All cameras served by this process, each ingested by its own asyncio task.
+
+    Every camera shares one ``httpx.AsyncClient`` on the app's event loop, so
+    adding cameras adds coroutines rather than OS threads. With
+    ``shared_memory=True`` the cameras read from the rings written by
+    shm_ingest.py instead of connecting to the ESP32 themselves.
+    """
+
+    def __init__(self, read_timeout: float = 10.0, shared_memory: bool = False, ring_size: int = 16):
+        self.read_timeout = read_timeout
+        self.shared_memory = shared_memory
+        self.ring_size = ring_size
+        self.cameras: Dict[str, Camera] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def add(self, camera_id: str, url: str) -> Camera:
+        camera = Camera(camera_id, url, shm_name=segment_name(camera_id) if self.shared_memory else None,
+                        ring_size=self.ring_size)
+        self.cameras[camera_id] = camera
+        if self._client is not None:
+            camera.task = asyncio.create_task(camera.run(self._client), name=f"ingest-{camera_id}")
+        return camera
+
+    def get(self, camera_id: str) -> Camera:
+        try:
+            return self.cameras[camera_id]
+        except KeyError:
+            raise UnknownCameraError(camera_id)
+
+    async def start(self):
+        timeout = httpx.Timeout(10.0, read=self.read_timeout)
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+        self._client = httpx.AsyncClient(timeout=timeout, limits=limits)
+        for camera in self.cameras.values():
+            if camera.task is None:
+                camera.task = asyncio.create_task(camera.run(self._client), name=f"ingest-{camera.id}")
+        logger.info(f"Started ingest for {len(self.cameras)} camera(s): {', '.join(self.cameras)}")
+
+    async def stop(self):
+        tasks = [c.task for c in self.cameras.values() if c.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for camera in self.cameras.values():
+            camera.task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {camera_id: camera.stats() for camera_id, camera in self.cameras.items()}
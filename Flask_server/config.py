@@ -0,0 +1,23 @@
+"""Settings shared by the server and the command-line tools.
+
+Kept apart from server.py so tools like batch_caption.py can read them without
+building the FastAPI app, camera registry and metrics.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.preprocess import PreprocessSettings
+
+# Example: Replace with your actual AI backend endpoint and key
+AI_BACKEND_URL = "https://8080-01jvyxcckwn7v10c56ara2prnw.cloudspaces.litng.ai/v1/chat/completions"
+AI_BACKEND_TIMEOUT = 30
+# Applied before base64 encoding; the default sends the camera's JPEG untouched.
+# Clients may override per request with a JSON "preprocess" object.
+PREPROCESS = PreprocessSettings(max_edge=None, quality=None, grayscale=False, crop=None)
+OPTIMIZED_PROMPT = (
+    "You are an assistive vision system for the visually impaired. "
+    "Given an image from a wearable or mobile camera, describe the scene in a way that maximizes situational awareness and independence. "
+    "Clearly identify objects, obstacles, people, and signage. If there is text, read it aloud and explain its context. "
+    "Use short, direct sentences and avoid technical jargon. Prioritize information that would help a visually impaired user navigate or understand their environment."
+)
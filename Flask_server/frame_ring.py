@@ -0,0 +1,60 @@
+import time
+from typing import List, Optional
+
+from shared.frame import Frame
+
+
+class FrameRing:
+    """The last ``capacity`` frames of one camera, oldest overwritten first.
+
+    Slots are allocated once up front; pushing a frame only replaces a
+    reference and bumps an index, so the ring never grows or reallocates
+    however long the camera streams.
+    """
+
+    def __init__(self, capacity: int = 16):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._slots: List[Optional[Frame]] = [None] * capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, frame: Frame):
+        self._slots[self._next] = frame
+        self._next = (self._next + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def latest(self) -> Optional[Frame]:
+        if not self._count:
+            return None
+        return self._slots[self._next - 1]
+
+    def recent(self, window: float, now: Optional[float] = None) -> List[Frame]:
+        """Frames no older than ``window`` seconds, newest first (at least the newest one)."""
+        now = time.time() if now is None else now
+        frames = []
+        for i in range(1, self._count + 1):
+            frame = self._slots[self._next - i]
+            if frames and now - frame.timestamp > window:
+                break
+            frames.append(frame)
+        return frames
+
+
+def sharpest(frames: List[Frame]) -> Optional[Frame]:
+    """The frame with the highest focus measure; ties and failures favour the newest.
+
+    Decodes each candidate at 1/4 scale once (cached on the frame), so call
+    it off the event loop.
+    """
+    best, best_score = None, -1.0
+    for frame in frames:
+        score = frame.sharpness
+        if score is not None and score > best_score:
+            best, best_score = frame, score
+    return best if best is not None else (frames[0] if frames else None)
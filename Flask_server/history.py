@@ -0,0 +1,186 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from metrics import Counter, Histogram
+
+HISTORY_WRITES = Counter("inteligaze_history_writes_total", "Descriptions written to the history store")
+HISTORY_DROPPED = Counter("inteligaze_history_dropped_total", "Descriptions dropped because the history writer fell behind")
+HISTORY_BATCH = Histogram("inteligaze_history_batch_seconds", "Time to commit one batch of history rows")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    instruction TEXT NOT NULL,
+    max_tokens INTEGER NOT NULL,
+    preprocess TEXT,
+    frame_hash INTEGER,
+    content_hash INTEGER,
+    latency_ms REAL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS descriptions_time ON descriptions (timestamp);
+CREATE INDEX IF NOT EXISTS descriptions_camera_time ON descriptions (camera_id, timestamp);
+CREATE INDEX IF NOT EXISTS descriptions_frame ON descriptions (frame_hash, timestamp);
+"""
+# Created after migrating, since older stores lack the column
+CONTENT_INDEX = "CREATE INDEX IF NOT EXISTS descriptions_content ON descriptions (content_hash, timestamp)"
+COLUMNS = ("id", "timestamp", "camera_id", "source", "instruction", "max_tokens", "preprocess", "frame_hash", "latency_ms", "cached", "text")
+
+
+def to_signed(frame_hash: Optional[int]) -> Optional[int]:
+    # SQLite integers are signed 64-bit; dHashes and content hashes use all 64 bits
+    if frame_hash is None:
+        return None
+    return frame_hash - (1 << 64) if frame_hash >= 1 << 63 else frame_hash
+
+
+def to_hex(frame_hash: Optional[int]) -> Optional[str]:
+    return None if frame_hash is None else f"{frame_hash & ((1 << 64) - 1):016x}"
+
+
+class HistoryStore:
+    """Every description the server produced, persisted to SQLite.
+
+    Each row keeps two hashes of its frame: the perceptual dHash
+    (``frame_hash``) for finding similar frames through ``query``, and a
+    BLAKE2b digest of the JPEG bytes (``content_hash``) that ``lookup`` uses,
+    since only a byte-identical frame may reuse an hours-old answer.
+
+    ``add`` only appends to an in-memory queue, so the request path never
+    touches the disk; a background thread commits whatever has queued up
+    every ``flush_interval`` seconds in one transaction. Reads open their own
+    connection per thread (WAL mode lets them run while the writer commits).
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, max_pending: int = 10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self._pending = deque()
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = False
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        # Stores created before these columns existed
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(descriptions)")}
+        for column, kind in (("preprocess", "TEXT"), ("content_hash", "INTEGER")):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE descriptions ADD COLUMN {column} {kind}")
+        conn.execute(CONTENT_INDEX)
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, camera_id: str, source: str, instruction: str, max_tokens: int, preprocess: str, text: str,
+            frame=None, latency: Optional[float] = None, cached: bool = False, timestamp: Optional[float] = None):
+        """Queue one description. ``frame`` is only hashed later, on the writer thread;
+        ``preprocess`` is ``PreprocessSettings.describe()`` of how it was sent."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            HISTORY_DROPPED.inc()
+            return
+        self._pending.append((timestamp or time.time(), camera_id, source, instruction, max_tokens, preprocess, frame,
+                              None if latency is None else round(latency * 1000, 1), int(cached), text))
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            self._wake.wait(self.flush_interval)
+            stopping = self._stop
+            batch = []
+            while self._pending:
+                batch.append(self._pending.popleft())
+            if batch:
+                start = time.perf_counter()
+                rows = [(ts, camera_id, source, instruction, max_tokens, preprocess,
+                         to_signed(frame.dhash) if frame is not None else None,
+                         to_signed(frame.content_hash) if frame is not None else None, latency_ms, cached, text)
+                        for ts, camera_id, source, instruction, max_tokens, preprocess, frame, latency_ms, cached, text in batch]
+                try:
+                    with conn:
+                        conn.executemany("INSERT INTO descriptions (timestamp, camera_id, source, instruction, max_tokens, "
+                                         "preprocess, frame_hash, content_hash, latency_ms, cached, text) "
+                                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    self.written += len(rows)
+                    HISTORY_WRITES.inc(len(rows))
+                except sqlite3.Error as e:
+                    logger.error(f"History write failed, dropped {len(rows)} row(s): {e!r}")
+                    self.dropped += len(rows)
+                    HISTORY_DROPPED.inc(len(rows))
+                HISTORY_BATCH.observe(time.perf_counter() - start)
+            if stopping:
+                conn.close()
+                return
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+
+    def query(self, camera_id: Optional[str] = None, frame_hash: Optional[int] = None, since: Optional[float] = None,
+              until: Optional[float] = None, before: Optional[Tuple[float, int]] = None,
+              limit: int = 50) -> Tuple[List[dict], Optional[Tuple[float, int]]]:
+        """Newest first. Returns (rows, cursor); pass the cursor as ``before`` for the next page."""
+        where, args = [], []
+        if camera_id is not None:
+            where.append("camera_id = ?")
+            args.append(camera_id)
+        if frame_hash is not None:
+            where.append("frame_hash = ?")
+            args.append(to_signed(frame_hash))
+        if since is not None:
+            where.append("timestamp >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("timestamp < ?")
+            args.append(until)
+        if before is not None:
+            # Keyset pagination: stable while new rows arrive, and no OFFSET scan
+            where.append("(timestamp, id) < (?, ?)")
+            args.extend(before)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM descriptions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        rows = self._connect().execute(sql, (*args, limit + 1)).fetchall()
+        items = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+        for item in items:
+            item["frame_hash"] = to_hex(item["frame_hash"])
+            item["cached"] = bool(item["cached"])
+        cursor = (items[-1]["timestamp"], items[-1]["id"]) if len(rows) > limit else None
+        return items, cursor
+
+    def lookup(self, camera_id: str, content_hash: int, instruction: str, max_tokens: int, preprocess: str,
+               max_age: float) -> Optional[str]:
+        """Most recent backend answer for a byte-identical frame (``Frame.content_hash``) from the same
+        camera, sent the same way with the same question, if young enough. Rows that were themselves
+        reused are ignored, so an answer ages out even while it keeps being served."""
+        row = self._connect().execute(
+            "SELECT text FROM descriptions WHERE content_hash = ? AND timestamp >= ? AND cached = 0 "
+            "AND camera_id = ? AND instruction = ? AND max_tokens = ? AND preprocess = ? "
+            "ORDER BY timestamp DESC LIMIT 1",
+            (to_signed(content_hash), time.time() - max_age, camera_id, instruction, max_tokens, preprocess)).fetchone()
+        return row[0] if row is not None else None
+
+    def stats(self) -> dict:
+        return {"written": self.written, "dropped": self.dropped, "pending": len(self._pending)}
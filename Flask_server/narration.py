@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+from broadcast import FrameBroadcaster, Subscriber
+from cameras import Camera
+from shared.frame import Frame
+
+
+class Narrator:
+    """Captions one camera continuously and pushes results to all listeners.
+
+    A single loop serves every subscriber, so ten listeners cost one backend
+    call per cycle. The cadence adapts to the scene: it speeds up to
+    ``min_interval`` when the frame's dHash moves more than
+    ``change_distance`` bits from the last captioned frame and backs off
+    towards ``max_interval`` while the scene stays put. Camera connection
+    changes are pushed as ``status`` messages as they happen. The loop only
+    runs while someone is listening.
+    """
+
+    def __init__(
+        self,
+        camera: Camera,
+        describe: Callable[[Frame], Awaitable[str]],
+        min_interval: float = 2.0,
+        max_interval: float = 15.0,
+        change_distance: int = 10,
+        poll_interval: float = 0.5,
+    ):
+        self.camera = camera
+        self.describe = describe
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_distance = change_distance
+        self.poll_interval = poll_interval
+        self.interval = min_interval
+        self.listeners = FrameBroadcaster()
+        self.task: Optional[asyncio.Task] = None
+        self.narrations = 0
+
+    def subscribe(self) -> Subscriber:
+        sub = self.listeners.subscribe(maxsize=16)
+        sub.offer(self.status_message())
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(), name=f"narration-{self.camera.id}")
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.listeners.unsubscribe(sub)
+        if not len(self.listeners) and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def status_message(self) -> dict:
+        return {"type": "status", "camera_id": self.camera.id, "esp32_connected": self.camera.is_live()}
+
+    def _scene_changed(self, frame: Frame, last: Optional[Frame]) -> bool:
+        if last is None or frame.dhash is None or last.dhash is None:
+            return True
+        return (frame.dhash ^ last.dhash).bit_count() > self.change_distance
+
+    async def run(self):
+        connected = self.camera.is_live()
+        last_frame: Optional[Frame] = None
+        next_at = 0.0
+        while True:
+            now_connected = self.camera.is_live()
+            if now_connected != connected:
+                connected = now_connected
+                self.listeners.publish(self.status_message())
+            frame = self.camera.latest_frame
+            now = time.monotonic()
+            if connected and frame is not None and frame is not last_frame:
+                changed = self._scene_changed(frame, last_frame)
+                if changed or now >= next_at:
+                    self.interval = self.min_interval if changed else min(self.interval * 1.5, self.max_interval)
+                    start = time.perf_counter()
+                    try:
+                        text = await self.describe(frame)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"[{self.camera.id}] Narration failed: {e!r}")
+                        self.listeners.publish({"type": "error", "camera_id": self.camera.id, "error": str(e)})
+                    else:
+                        self.narrations += 1
+                        self.listeners.publish({
+                            "type": "narration",
+                            "camera_id": self.camera.id,
+                            "text": text,
+                            "frame_time": frame.timestamp,
+                            "latency_ms": (time.perf_counter() - start) * 1000,
+                            "next_interval": self.interval,
+                        })
+                    last_frame = frame
+                    next_at = time.monotonic() + self.interval
+                    # Don't caption again before the scene has had a chance to change
+                    await asyncio.sleep(self.min_interval)
+                    continue
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> dict:
+        return {"listeners": len(self.listeners), "narrations": self.narrations, "interval": round(self.interval, 2)}
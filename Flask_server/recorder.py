@@ -0,0 +1,332 @@
+"""Record camera frames to disk and replay them in place of an ESP32.
+
+Layout: one directory per camera holding segment pairs
+    <start_ms>.jpgs  raw JPEG frames back to back
+    <start_ms>.idx   one 20-byte record per frame: timestamp (f8), offset (u8), length (u4)
+A new segment starts when the current one exceeds its size or duration
+limit. Because the index has fixed-size records, replay can load it with a
+single numpy read and seek by timestamp with a binary search.
+
+Replay as a camera: set a camera URL to ``replay://<dir>?speed=4&loop=1``
+(speed=0 replays as fast as possible). To stand in for the ESP32 on the
+network, e.g. for the desktop app:
+
+    python recorder.py serve recordings/default --port 8081 --speed 1
+"""
+import argparse
+import asyncio
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from loguru import logger
+
+from metrics import Counter, Histogram
+
+# numpy is only imported to read recordings back, so recording-free servers never load it
+INDEX_RECORD = struct.Struct("<dQI")
+INDEX_FIELDS = [("timestamp", "<f8"), ("offset", "<u8"), ("length", "<u4")]
+DATA_SUFFIX = ".jpgs"
+INDEX_SUFFIX = ".idx"
+REPLAY_SCHEME = "replay://"
+
+RECORD_FRAMES = Counter("inteligaze_record_frames_total", "Frames written by the recorder", ["camera"])
+RECORD_DROPPED = Counter("inteligaze_record_frames_dropped_total", "Frames dropped because the recorder fell behind", ["camera"])
+RECORD_BATCH = Histogram("inteligaze_record_batch_seconds", "Time to write one batch of frames to disk", ["camera"])
+
+
+class FrameRecorder:
+    """Camera sink that appends frames to rotating segment files.
+
+    Calling the recorder (from the ingest loop) only appends a reference to
+    an in-memory queue; a background thread drains it every
+    ``flush_interval`` seconds and writes the whole batch with one write per
+    file. If the disk cannot keep up, frames beyond ``max_pending`` are
+    dropped rather than stalling ingest.
+    """
+
+    def __init__(self, directory: str, camera_id: str = "camera", segment_bytes: int = 256 * 1024 * 1024,
+                 segment_seconds: float = 300.0, flush_interval: float = 0.5, max_pending: int = 256):
+        self.directory = directory
+        self.camera_id = camera_id
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.frames = 0
+        self.dropped = 0
+        self.segments = 0
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._stop = False
+        self._data = None
+        self._index = None
+        self._segment_start = 0.0
+        self._m_frames = RECORD_FRAMES.labels(camera_id)
+        self._m_dropped = RECORD_DROPPED.labels(camera_id)
+        self._m_batch = RECORD_BATCH.labels(camera_id)
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"recorder-{camera_id}", daemon=True)
+        self._thread.start()
+
+    def __call__(self, frame):
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            self._m_dropped.inc()
+            return
+        self._pending.append((frame.timestamp, frame.jpeg))
+
+    def _open_segment(self, timestamp: float):
+        self._close_segment()
+        base = os.path.join(self.directory, f"{int(timestamp * 1000):013d}")
+        self._data = open(base + DATA_SUFFIX, "ab")
+        self._index = open(base + INDEX_SUFFIX, "ab")
+        self._segment_start = timestamp
+        self.segments += 1
+        logger.info(f"[{self.camera_id}] Recording to segment {base}{DATA_SUFFIX}")
+
+    def _close_segment(self):
+        if self._data is not None:
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+    def _write_batch(self, batch: List[Tuple[float, bytes]]):
+        start = time.perf_counter()
+        i = 0
+        while i < len(batch):
+            timestamp = batch[i][0]
+            if (self._data is None or self._data.tell() >= self.segment_bytes
+                    or timestamp - self._segment_start >= self.segment_seconds):
+                self._open_segment(timestamp)
+            offset = self._data.tell()
+            # Frames up to the segment limit go out in a single write per file
+            j = i
+            records = []
+            size = offset
+            while j < len(batch) and (j == i or size < self.segment_bytes):
+                ts, jpeg = batch[j]
+                records.append((ts, size, len(jpeg)))
+                size += len(jpeg)
+                j += 1
+            self._data.write(b"".join(jpeg for _, jpeg in batch[i:j]))
+            self._index.write(b"".join(INDEX_RECORD.pack(*record) for record in records))
+            i = j
+        self._data.flush()
+        self._index.flush()
+        self.frames += len(batch)
+        self._m_frames.inc(len(batch))
+        self._m_batch.observe(time.perf_counter() - start)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            stopping = self._stop
+            batch = []
+            while self._pending:
+                batch.append(self._pending.popleft())
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except OSError as e:
+                    logger.error(f"[{self.camera_id}] Recording failed, dropped {len(batch)} frame(s): {e!r}")
+                    self.dropped += len(batch)
+                    self._m_dropped.inc(len(batch))
+                    self._close_segment()
+            if stopping:
+                self._close_segment()
+                return
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {"frames": self.frames, "dropped": self.dropped, "pending": len(self._pending), "segments": self.segments}
+
+
+class Segment:
+    """One recorded segment, memory-mapped read-only."""
+
+    def __init__(self, base: str):
+        import numpy as np
+
+        self.base = base
+        with open(base + INDEX_SUFFIX, "rb") as f:
+            raw = f.read()
+        # Ignore a record cut short by a crash mid-write
+        self.index = np.frombuffer(raw[:len(raw) - len(raw) % INDEX_RECORD.size], dtype=np.dtype(INDEX_FIELDS))
+        self._file = open(base + DATA_SUFFIX, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # A segment still being written may have index entries past the data on disk
+        if len(self.index):
+            complete = self.index["offset"] + self.index["length"] <= size
+            self.index = self.index[complete]
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, i: int) -> Tuple[float, bytes]:
+        timestamp, offset, length = self.index[i]
+        offset = int(offset)
+        return float(timestamp), self._mm[offset:offset + int(length)]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+def list_segments(directory: str) -> List[str]:
+    return sorted(os.path.join(directory, name[:-len(INDEX_SUFFIX)])
+                  for name in os.listdir(directory)
+                  if name.endswith(INDEX_SUFFIX) and os.path.exists(os.path.join(directory, name[:-len(INDEX_SUFFIX)] + DATA_SUFFIX)))
+
+
+class Recording:
+    """All segments of one camera's recording, read in timestamp order."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments = [s for s in (Segment(base) for base in list_segments(directory)) if len(s)]
+        if not self.segments:
+            raise FileNotFoundError(f"No recorded frames in {directory}")
+        self._starts = [float(s.index["timestamp"][0]) for s in self.segments]
+
+    @property
+    def start(self) -> float:
+        return self._starts[0]
+
+    @property
+    def end(self) -> float:
+        return float(self.segments[-1].index["timestamp"][-1])
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+    def frames(self, start: Optional[float] = None) -> Iterator[Tuple[float, bytes]]:
+        """Yield ``(timestamp, jpeg)`` from the first frame at or after ``start`` (epoch seconds)."""
+        first_segment, first_frame = 0, 0
+        if start is not None:
+            import numpy as np
+
+            first_segment = max(0, bisect.bisect_right(self._starts, start) - 1)
+            first_frame = int(np.searchsorted(self.segments[first_segment].index["timestamp"], start))
+        for s in range(first_segment, len(self.segments)):
+            segment = self.segments[s]
+            for i in range(first_frame if s == first_segment else 0, len(segment)):
+                yield segment.frame(i)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+
+def parse_replay_url(url: str) -> Tuple[str, float, bool, float]:
+    """``replay://<dir>?speed=2&loop=1&start=30`` -> (dir, speed, loop, start offset in seconds)."""
+    path, _, query = url[len(REPLAY_SCHEME):].partition("?")
+    query = parse_qs(query)
+    speed = float(query.get("speed", ["1"])[0])
+    loop = query.get("loop", ["0"])[0] in ("1", "true", "yes")
+    offset = float(query.get("start", ["0"])[0])
+    return path, speed, loop, offset
+
+
+def replay(recording: Recording, speed: float = 1.0, loop: bool = False, offset: float = 0.0):
+    """Yield ``(delay, timestamp, jpeg)``: how long to wait before each frame to keep the recorded pace."""
+    while True:
+        wall_start = time.monotonic()
+        first = None
+        for timestamp, jpeg in recording.frames(recording.start + offset if offset else None):
+            if first is None:
+                first = timestamp
+            delay = 0.0
+            if speed > 0:
+                delay = wall_start + (timestamp - first) / speed - time.monotonic()
+            yield delay, timestamp, jpeg
+        if not loop:
+            return
+
+
+async def run_replay(camera, url: str):
+    """Feed a Camera from a recording instead of its ESP32 (see Camera.run)."""
+    directory, speed, loop, offset = parse_replay_url(url)
+    recording = await asyncio.to_thread(Recording, directory)
+    logger.info(f"[{camera.id}] Replaying {len(recording)} frame(s) from {directory} at {speed or 'max'}x{' (looping)' if loop else ''}")
+    camera.connected = True
+    try:
+        for delay, _, jpeg in replay(recording, speed, loop, offset):
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif speed <= 0:
+                await asyncio.sleep(0)  # let the rest of the app run between frames
+            camera.ingest(jpeg)
+        logger.info(f"[{camera.id}] Replay of {directory} finished.")
+    finally:
+        camera.connected = False
+        recording.close()
+
+
+def serve(directory: str, port: int, speed: float, loop: bool):
+    """Serve a recording as multipart MJPEG, framed like camera-feed.ino."""
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            recording = Recording(directory)
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace;boundary=frame")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                for delay, _, jpeg in replay(recording, speed, loop):
+                    if delay > 0:
+                        time.sleep(delay)
+                    self.wfile.write(b"--frame")
+                    self.wfile.write(b"Content-Type: image/jpeg\r\nContent-Length: %u\r\n\r\n" % len(jpeg))
+                    self.wfile.write(jpeg)
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                recording.close()
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), ReplayHandler)
+    server.daemon_threads = True
+    logger.info(f"Serving {directory} as MJPEG on http://0.0.0.0:{port}/ at {speed or 'max'}x")
+    server.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or serve recorded frames.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="summarize a camera's recording")
+    info.add_argument("directory")
+    srv = sub.add_parser("serve", help="serve a recording as an ESP32-style MJPEG stream")
+    srv.add_argument("directory")
+    srv.add_argument("--port", type=int, default=8081)
+    srv.add_argument("--speed", type=float, default=1.0, help="playback rate; 0 = as fast as possible")
+    srv.add_argument("--loop", action="store_true")
+    args = ap.parse_args()
+    if args.command == "info":
+        recording = Recording(args.directory)
+        duration = recording.end - recording.start
+        size = sum(os.path.getsize(s.base + DATA_SUFFIX) for s in recording.segments)
+        print(f"{len(recording)} frames in {len(recording.segments)} segment(s), {duration:.1f}s, "
+              f"{size / 1e6:.1f} MB, {len(recording) / duration if duration else 0:.1f} fps")
+        recording.close()
+    else:
+        serve(args.directory, args.port, args.speed, args.loop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class PerceptualCache:
+    """LRU + TTL cache of backend responses keyed by a perceptual frame hash.
+
+    A lookup hits when an unexpired entry has the same key (camera,
+    instruction, max_tokens and preprocess settings) and a hash within ``max_distance`` bits of the query, so a
+    camera looking at an unchanged scene gets the previous description back
+    instead of another backend round-trip.
+    """
+
+    def __init__(self, max_distance: int = 5, ttl: float = 30.0, max_size: int = 256):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phash: int, key: Hashable) -> Optional[str]:
+        now = time.time()
+        found = None
+        for entry_key, (expires, value) in list(self._entries.items()):
+            if expires < now:
+                del self._entries[entry_key]
+                continue
+            entry_hash, k = entry_key
+            if k == key and (entry_hash ^ phash).bit_count() <= self.max_distance:
+                found = entry_key
+                break
+        if found is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(found)
+        self.hits += 1
+        return self._entries[found][1]
+
+    def put(self, phash: int, key: Hashable, value: str):
+        entry_key = (phash, key)
+        self._entries[entry_key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,3 @@
+start "inteligaze-ingest" python shm_ingest.py
+set INTELIGAZE_SHARED_MEMORY=1
+uvicorn server:app --host 0.0.0.0 --port 8000 --workers 4
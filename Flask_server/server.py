@@ -1,15 +1,33 @@
-from fastapi import FastAPI, Form, Request, Body
+from fastapi import FastAPI, Form, Request, Body, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import base64
 import httpx
 from loguru import logger
 import time
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, Union
-import threading
-import cv2
-import numpy as np
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.frame import Frame
+from shared.preprocess import PreprocessSettings
+from shared.quality import DEFAULT_LADDER, QualityController
+from config import AI_BACKEND_URL, AI_BACKEND_TIMEOUT, OPTIMIZED_PROMPT, PREPROCESS
+from shared.payload import DEFAULT_MAX_TOKENS, STREAM_DONE, build_vision_payload, build_stream_payload, extract_content, parse_stream_line
+from backend_client import BackendBusyError
+from backend_pool import BackendPool, NoBackendAvailableError
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram
+from singleflight import SingleFlight
+from response_cache import PerceptualCache
+from history import HistoryStore
+from cameras import CameraRegistry, UnknownCameraError
+from recorder import REPLAY_SCHEME, FrameRecorder
+from frame_ring import sharpest
+from narration import Narrator
 
 app = FastAPI()
 
@@ -22,63 +40,162 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Example: Replace with your actual AI backend endpoint and key
-AI_BACKEND_URL = "https://8080-01jvyxcckwn7v10c56ara2prnw.cloudspaces.litng.ai/v1/chat/completions"
+# AI_BACKEND_URL, AI_BACKEND_TIMEOUT, PREPROCESS and OPTIMIZED_PROMPT are set in config.py
 ESP32_STREAM_URL = "http://192.168.251.53/"  # <-- Set your ESP32 MJPEG stream URL here
-OPTIMIZED_PROMPT = (
-    "You are an assistive vision system for the visually impaired. "
-    "Given an image from a wearable or mobile camera, describe the scene in a way that maximizes situational awareness and independence. "
-    "Clearly identify objects, obstacles, people, and signage. If there is text, read it aloud and explain its context. "
-    "Use short, direct sentences and avoid technical jargon. Prioritize information that would help a visually impaired user navigate or understand their environment."
-)
+DEFAULT_CAMERA_ID = "default"
+# camera_id -> MJPEG stream URL; add more entries for additional wearable cameras
+CAMERAS = {DEFAULT_CAMERA_ID: ESP32_STREAM_URL}
+# Multi-worker mode: shm_ingest.py owns the camera connections and API workers
+# read frames from shared memory (see run_workers.bat)
+SHARED_MEMORY_FRAMES = os.environ.get("INTELIGAZE_SHARED_MEMORY") == "1"
+SHM_SLOTS = 8
+SHM_SLOT_SIZE = 512 * 1024  # bytes; larger frames are dropped
+FRAME_RING_SIZE = 16  # recent frames kept per camera
+# Append every ingested frame to RECORDINGS_DIR/<camera_id>/ for later replay
+# (point a camera at "replay://recordings/default?speed=4" to play it back)
+RECORD_FRAMES = os.environ.get("INTELIGAZE_RECORD") == "1"
+RECORDINGS_DIR = "recordings"
+RECORD_SEGMENT_BYTES = 256 * 1024 * 1024  # start a new segment file after this many bytes
+RECORD_SEGMENT_SECONDS = 300  # ... or after this long
+# "sharpest": send the least motion-blurred frame of the last FRAME_SELECTION_WINDOW
+# seconds instead of simply the newest one ("latest"). Clients may override per
+# request with JSON "frame_selection" and "selection_window_ms".
+FRAME_SELECTION = "sharpest"
+FRAME_SELECTION_WINDOW = 0.5  # seconds
+# When there is no frame yet (or none younger than the request's max_frame_age_ms),
+# /vision waits this long for the next one before answering 503. Clients may
+# override per request with "wait_ms" (JSON or query string).
+FRAME_WAIT = 2.0  # seconds
+FRAME_WAIT_MAX = 10.0  # seconds; larger "wait_ms" is rejected with 400
+FRAME_MAX_AGE = None  # seconds; default for "max_frame_age_ms", None = any age
+# (url, weight) of every AI backend replica; requests are spread by weight
+AI_BACKENDS = [(AI_BACKEND_URL, 1.0)]
+AI_BACKEND_HEDGE = True  # duplicate a slow request to a second backend (needs 2+ backends)
+AI_BACKEND_HEDGE_PERCENTILE = 0.95  # hedge once a request is slower than this latency percentile
+AI_BACKEND_HEDGE_MIN_DELAY = 0.5  # seconds; never hedge sooner than this
+AI_BACKEND_FAILURE_THRESHOLD = 3  # consecutive failures that open a backend's circuit breaker
+AI_BACKEND_COOLDOWN = 15  # seconds an open breaker rejects traffic before a probe
+AI_BACKEND_HTTP2 = False  # requires the 'h2' package
+AI_BACKEND_MAX_IN_FLIGHT = 8  # concurrent backend requests; extra requests queue
+AI_BACKEND_QUEUE_TIMEOUT = 10  # seconds a request may wait for a free slot
+# Adaptive quality: step down the ladder when the p90 of /vision latency exceeds
+# the target, back up when there is headroom. Per-request "preprocess" and
+# "max_tokens" still override the current level.
+QUALITY_CONTROL_ENABLED = True
+QUALITY_TARGET_SECONDS = 2.0
+QUALITY_PERCENTILE = 0.9
+QUALITY_LADDER = [(PREPROCESS, DEFAULT_MAX_TOKENS)] + DEFAULT_LADDER[1:]
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_DISTANCE = 5  # max Hamming distance between frame dHashes for a hit
+RESPONSE_CACHE_TTL = 30  # seconds
+RESPONSE_CACHE_SIZE = 256
+# Every description is kept in an SQLite file for GET /history
+HISTORY_ENABLED = True
+HISTORY_DB = "history.sqlite3"
+HISTORY_REUSE_MAX_AGE = 3600  # seconds; answer a repeated question about a byte-identical frame from history (0 = off)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+NARRATION_MIN_INTERVAL = 2.0  # seconds between narrations while the scene keeps changing
+NARRATION_MAX_INTERVAL = 15.0  # seconds between narrations of an unchanged scene
+NARRATION_CHANGE_DISTANCE = 10  # dHash bits that count as a scene change
+STREAM_QUEUE_SIZE = 2  # frames buffered per /stream viewer before the oldest is dropped
 
-# In-memory storage for the latest ESP32 frame
-latest_frame: Optional[bytes] = None
-latest_frame_time: Optional[float] = None
-stream_thread_started = False
+# Per-camera ingest tasks and latest-frame slots
+camera_registry = CameraRegistry(shared_memory=SHARED_MEMORY_FRAMES, ring_size=FRAME_RING_SIZE)
+# camera_id -> Narrator behind /ws/narration, created on first subscriber
+narrators = {}
+# camera_id -> FrameRecorder, when RECORD_FRAMES is on
+recorders = {}
+backend_pool: Optional[BackendPool] = None
+history: Optional[HistoryStore] = None
+# Concurrent /vision calls for the same frame, instruction and max_tokens share one backend call
+vision_calls = SingleFlight()
+# Near-identical frames (static scene) from the same camera with the same instruction reuse the previous description
+response_cache = PerceptualCache(RESPONSE_CACHE_MAX_DISTANCE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE)
+quality = QualityController(QUALITY_LADDER, QUALITY_TARGET_SECONDS, QUALITY_PERCENTILE)
+
+VISION_REQUESTS = Counter("inteligaze_vision_requests_total", "Vision requests by endpoint and outcome (hit, miss or HTTP status)", ["endpoint", "outcome"])
+VISION_STAGE = Histogram(
+    "inteligaze_vision_stage_seconds",
+    "Vision request stages: frame_age (age of the frame used), frame_select (sharpest-frame search), "
+    "preprocess (resize/encode/base64), "
+    "backend (AI round trip incl. queueing), first_token and total",
+    ["stage"],
+)
+CAMERA_CONNECTED = Gauge("inteligaze_camera_connected", "1 if a frame arrived in the last 10 s", ["camera"])
+CAMERA_FRAME_AGE = Gauge("inteligaze_camera_frame_age_seconds", "Age of the latest frame", ["camera"])
+BACKEND_IN_FLIGHT = Gauge("inteligaze_backend_in_flight", "Requests in flight per AI backend", ["backend"])
+BACKEND_BREAKER_OPEN = Gauge("inteligaze_backend_breaker_open", "1 while the backend's circuit breaker rejects traffic", ["backend"])
+QUALITY_LEVEL = Gauge("inteligaze_quality_level", "Current adaptive quality level (0 = best)")
+RESPONSE_CACHE_ENTRIES = Gauge("inteligaze_response_cache_entries", "Entries in the perceptual response cache")
 
 class VisionRequest(BaseModel):
     instruction: str = OPTIMIZED_PROMPT
 
+def start_recorder(camera) -> FrameRecorder:
+    recorder = FrameRecorder(os.path.join(RECORDINGS_DIR, camera.id), camera.id,
+                             segment_bytes=RECORD_SEGMENT_BYTES, segment_seconds=RECORD_SEGMENT_SECONDS)
+    camera.sinks.append(recorder)
+    return recorder
+
 @app.on_event("startup")
-def start_stream_thread():
-    global stream_thread_started
-    if not stream_thread_started:
-        t = threading.Thread(target=esp32_stream_worker, daemon=True)
-        t.start()
-        stream_thread_started = True
-        logger.info("Started ESP32 MJPEG stream background thread.")
-
-def esp32_stream_worker():
-    global latest_frame, latest_frame_time
-    while True:
-        try:
-            logger.info(f"Connecting to ESP32 stream at {ESP32_STREAM_URL}")
-            with httpx.stream("GET", ESP32_STREAM_URL, timeout=10) as resp:
-                if resp.status_code == 200:
-                    logger.info("Connected to ESP32 stream.")
-                    bytes_data = b''
-                    for chunk in resp.iter_bytes(chunk_size=1024):
-                        bytes_data += chunk
-                        a = bytes_data.find(b'\xff\xd8')
-                        b = bytes_data.find(b'\xff\xd9')
-                        if a != -1 and b != -1:
-                            jpg = bytes_data[a:b+2]
-                            bytes_data = bytes_data[b+2:]
-                            # Optionally, decode to check validity
-                            try:
-                                frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                                if frame is not None:
-                                    latest_frame = jpg
-                                    latest_frame_time = time.time()
-                            except Exception as e:
-                                logger.warning(f"Frame decode error: {e}")
-                else:
-                    logger.error(f"ESP32 stream returned status {resp.status_code}")
-                    time.sleep(5)
-        except Exception as e:
-            logger.error(f"ESP32 stream connection error: {e}")
-            time.sleep(5)
+async def start_camera_ingest():
+    for camera_id, url in CAMERAS.items():
+        if camera_id not in camera_registry.cameras:
+            camera_registry.add(camera_id, url)
+    # With shared memory the ingest process records, not each API worker
+    if RECORD_FRAMES and not SHARED_MEMORY_FRAMES:
+        for camera_id, camera in camera_registry.cameras.items():
+            if camera_id not in recorders and not camera.url.startswith(REPLAY_SCHEME):
+                recorders[camera_id] = start_recorder(camera)
+    await camera_registry.start()
+
+@app.on_event("shutdown")
+async def stop_camera_ingest():
+    for narrator in narrators.values():
+        await narrator.stop()
+    await camera_registry.stop()
+    for recorder in recorders.values():
+        await asyncio.to_thread(recorder.close)
+    recorders.clear()
+
+@app.on_event("startup")
+async def start_backend_pool():
+    global backend_pool
+    backend_pool = BackendPool(
+        AI_BACKENDS,
+        hedge=AI_BACKEND_HEDGE,
+        hedge_percentile=AI_BACKEND_HEDGE_PERCENTILE,
+        hedge_min_delay=AI_BACKEND_HEDGE_MIN_DELAY,
+        failure_threshold=AI_BACKEND_FAILURE_THRESHOLD,
+        cooldown=AI_BACKEND_COOLDOWN,
+        timeout=AI_BACKEND_TIMEOUT,
+        http2=AI_BACKEND_HTTP2,
+        max_in_flight=AI_BACKEND_MAX_IN_FLIGHT,
+        queue_timeout=AI_BACKEND_QUEUE_TIMEOUT,
+    )
+    await backend_pool.start()
+
+@app.on_event("shutdown")
+async def close_backend_pool():
+    if backend_pool is not None:
+        await backend_pool.close()
+
+@app.on_event("startup")
+def open_history():
+    global history
+    if HISTORY_ENABLED:
+        history = HistoryStore(HISTORY_DB)
+
+@app.on_event("shutdown")
+def close_history():
+    if history is not None:
+        history.close()
+
+def record_history(source: str, camera_id: str, frame: Frame, instruction: str, max_tokens: int,
+                   settings: PreprocessSettings, text: str, latency: Optional[float] = None, cached: bool = False):
+    if history is not None:
+        history.add(camera_id, source, instruction, max_tokens, settings.describe(), text, frame, latency, cached)
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -92,55 +209,393 @@ async def log_requests(request: Request, call_next):
         logger.error(f"RID={idem} FAILED error={e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+class VisionRequestError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+def millis_param(request: Request, data: dict, name: str) -> Optional[float]:
+    """Optional non-negative milliseconds from the JSON body or query string, in seconds."""
+    value = data.get(name, request.query_params.get(name))
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise VisionRequestError(400, f"Invalid {name}: {value!r}")
+    if value < 0:
+        raise VisionRequestError(400, f"Invalid {name}: must not be negative")
+    return value / 1000
+
+async def parse_vision_request(request: Request, instruction: str, camera_id: str):
+    settings, max_tokens = quality_level()
+    selection, window = FRAME_SELECTION, FRAME_SELECTION_WINDOW
+    data = {}
+    # Try to get JSON body for instruction (for new clients)
+    if request.headers.get("content-type", "").startswith("application/json"):
+        data = await request.json()
+        instruction = data.get("instruction", instruction)
+        camera_id = data.get("camera_id", camera_id)
+        if data.get("max_tokens") is not None:
+            max_tokens = data["max_tokens"]
+            if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens < 1:
+                raise VisionRequestError(400, f"Invalid max_tokens: {max_tokens!r} (must be a positive integer)")
+        selection = data.get("frame_selection", selection)
+        if selection not in ("latest", "sharpest"):
+            raise VisionRequestError(400, f"Invalid frame_selection: {selection!r} (use 'latest' or 'sharpest')")
+        if data.get("preprocess") is not None:
+            try:
+                settings = PreprocessSettings.from_dict(data["preprocess"])
+            except (TypeError, ValueError) as e:
+                raise VisionRequestError(400, f"Invalid preprocess settings: {e}")
+    selection_window = millis_param(request, data, "selection_window_ms")
+    if selection_window is not None:
+        window = selection_window
+    max_age = millis_param(request, data, "max_frame_age_ms")
+    if max_age is None:
+        max_age = FRAME_MAX_AGE
+    wait = millis_param(request, data, "wait_ms")
+    if wait is None:
+        wait = FRAME_WAIT
+    elif wait > FRAME_WAIT_MAX:
+        raise VisionRequestError(400, f"Invalid wait_ms: at most {FRAME_WAIT_MAX * 1000:.0f}")
+    try:
+        camera = camera_registry.get(camera_id)
+    except UnknownCameraError:
+        raise VisionRequestError(404, f"Unknown camera: {camera_id}")
+    frame = await camera.fresh_frame(max_age, wait)
+    if frame is None:
+        wanted = f" younger than {max_age * 1000:.0f} ms" if max_age is not None else ""
+        logger.warning(f"[{camera_id}] No frame{wanted} within {wait * 1000:.0f} ms for vision endpoint.")
+        raise VisionRequestError(503, f"No ESP32 frame{wanted} available within {wait * 1000:.0f} ms. Please ensure ESP32 is streaming.")
+    if selection == "sharpest":
+        # Never trade freshness for sharpness beyond what the client allows
+        frame = await select_sharpest(camera, window if max_age is None else min(window, max_age))
+    VISION_STAGE.labels("frame_age").observe(frame.age)
+    return camera_id, frame, instruction, max_tokens, settings
+
+async def select_sharpest(camera, window: float) -> Frame:
+    candidates = camera.ring.recent(window)
+    if len(candidates) == 1:
+        return candidates[0]
+    start = time.perf_counter()
+    frame = await run_in_threadpool(sharpest, candidates)
+    VISION_STAGE.labels("frame_select").observe(time.perf_counter() - start)
+    logger.info(f"Picked frame {frame.seq} (sharpness {frame.sharpness or 0:.0f}) of {len(candidates)} from the last {window:.2f}s; "
+                f"newest is {candidates[0].seq} (sharpness {candidates[0].sharpness or 0:.0f})")
+    return frame
+
+def quality_level():
+    """Default (settings, max_tokens) for requests that don't choose their own."""
+    if QUALITY_CONTROL_ENABLED:
+        return quality.current
+    return PREPROCESS, DEFAULT_MAX_TOKENS
+
+# Errors that mean the backend is overloaded or unreachable; they count as
+# AI_BACKEND_TIMEOUT-long requests so the quality controller still steps down
+OVERLOAD_ERRORS = (BackendBusyError, NoBackendAvailableError, httpx.TransportError)
+
+def record_latency(seconds: float):
+    if not QUALITY_CONTROL_ENABLED:
+        return
+    level = quality.record(seconds)
+    if level is not None:
+        settings, max_tokens = quality.current
+        logger.info(f"Quality level -> {level}: {settings.describe()}, max_tokens={max_tokens}")
+
+async def prepare_image(frame: Frame, settings: PreprocessSettings) -> str:
+    start = time.perf_counter()
+    if settings.passthrough:
+        image_data_url = frame.data_url
+    else:
+        image_data_url = await run_in_threadpool(frame.encoded_data_url, settings)
+        if image_data_url is None:
+            raise ValueError("Could not preprocess frame")
+    VISION_STAGE.labels("preprocess").observe(time.perf_counter() - start)
+    logger.info(f"Preprocess {settings.describe()}: {len(frame.encode(settings))} bytes JPEG, {len(image_data_url)} bytes base64")
+    return image_data_url
+
+async def describe_frame(frame: Frame, instruction: str, max_tokens: int, settings: PreprocessSettings) -> str:
+    # Runs once per backend call, however many coalesced requests wait on it
+    start = time.perf_counter()
+    payload = build_vision_payload(await prepare_image(frame, settings), instruction, max_tokens)
+    logger.info("Sending async request to AI backend.")
+    try:
+        with VISION_STAGE.labels("backend").time():
+            resp = await backend_pool.post(payload)
+        resp.raise_for_status()
+    except OVERLOAD_ERRORS:
+        record_latency(AI_BACKEND_TIMEOUT)
+        raise
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code >= 500:
+            record_latency(AI_BACKEND_TIMEOUT)
+        raise
+    record_latency(time.perf_counter() - start)
+    logger.info("AI backend response received.")
+    return extract_content(resp.json())
+
+async def describe_cached(camera_id: str, frame: Frame, instruction: str, max_tokens: int, settings: PreprocessSettings):
+    """Describe a frame through the response cache, history and request coalescing; returns (text, cache_hit)."""
+    phash = frame.dhash if RESPONSE_CACHE_ENABLED else None
+    if phash is not None:
+        cached = response_cache.get(phash, (camera_id, instruction, max_tokens, settings))
+        if cached is not None:
+            logger.info("Serving vision response from cache.")
+            return cached, True
+    if history is not None and HISTORY_REUSE_MAX_AGE > 0:
+        # Byte-identical frames only: unlike the short-lived perceptual cache this may be hours old
+        cached = await run_in_threadpool(history.lookup, camera_id, frame.content_hash, instruction, max_tokens,
+                                         settings.describe(), HISTORY_REUSE_MAX_AGE)
+        if cached is not None:
+            logger.info("Serving vision response from history.")
+            return cached, True
+    key = (camera_id, frame.seq, instruction, max_tokens, settings)
+    text = await vision_calls.do(key, lambda: describe_frame(frame, instruction, max_tokens, settings))
+    if phash is not None:
+        response_cache.put(phash, (camera_id, instruction, max_tokens, settings), text)
+    return text, False
+
 @app.post("/vision")
 async def vision_endpoint(
     request: Request,
-    instruction: str = Form(OPTIMIZED_PROMPT)
+    instruction: str = Form(OPTIMIZED_PROMPT),
+    camera_id: str = DEFAULT_CAMERA_ID
 ):
-    global latest_frame, latest_frame_time
+    start = time.perf_counter()
     try:
-        # Try to get JSON body for instruction (for new clients)
-        if request.headers.get("content-type", "").startswith("application/json"):
-            data = await request.json()
-            instruction = data.get("instruction", instruction)
-        if not latest_frame:
-            logger.warning("No frame available for vision endpoint.")
-            return JSONResponse(status_code=400, content={"error": "No ESP32 frame available. Please ensure ESP32 is streaming."})
-        image_b64 = base64.b64encode(latest_frame).decode("utf-8")
-        image_data_url = f"data:image/jpeg;base64,{image_b64}"
-        payload = {
-            "max_tokens": 100,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": instruction},
-                        {"type": "image_url", "image_url": {"url": image_data_url}}
-                    ]
-                }
-            ]
-        }
-        headers = {"Content-Type": "application/json"}
-        async with httpx.AsyncClient(timeout=30) as client:
-            logger.info("Sending async request to AI backend.")
-            resp = await client.post(AI_BACKEND_URL, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            logger.info("AI backend response received.")
-            return {"response": data["choices"][0]["message"]["content"]}
+        camera_id, frame, instruction, max_tokens, settings = await parse_vision_request(request, instruction, camera_id)
+        frame_age_ms = round(frame.age * 1000, 1)
+        text, cache_hit = await describe_cached(camera_id, frame, instruction, max_tokens, settings)
+        record_history("vision", camera_id, frame, instruction, max_tokens, settings, text, time.perf_counter() - start, cache_hit)
+        response = JSONResponse(content={"response": text, "frame_age_ms": frame_age_ms},
+                                headers={"X-Cache": "hit" if cache_hit else "miss", "X-Frame-Age-Ms": str(frame_age_ms)})
+    except VisionRequestError as e:
+        response = JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    except (BackendBusyError, NoBackendAvailableError) as e:
+        logger.warning(str(e))
+        response = JSONResponse(status_code=503, content={"error": str(e)})
     except httpx.HTTPStatusError as e:
         logger.error(f"AI backend HTTP error: {e.response.status_code} {e.response.text}")
-        return JSONResponse(status_code=502, content={"error": f"AI backend error: {e.response.status_code} {e.response.text}"})
+        response = JSONResponse(status_code=502, content={"error": f"AI backend error: {e.response.status_code} {e.response.text}"})
+    except Exception as e:
+        logger.error(f"Unhandled error: {e}")
+        response = JSONResponse(status_code=500, content={"error": str(e)})
+    outcome = response.headers.get("X-Cache") or str(response.status_code)
+    VISION_REQUESTS.labels("vision", outcome).inc()
+    VISION_STAGE.labels("total").observe(time.perf_counter() - start)
+    return response
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/vision/stream")
+async def vision_stream_endpoint(
+    request: Request,
+    instruction: str = Form(OPTIMIZED_PROMPT),
+    camera_id: str = DEFAULT_CAMERA_ID
+):
+    """Relay the backend's token deltas as Server-Sent Events.
+
+    Emits ``delta`` events with partial text, then one ``done`` event with the
+    full text, time-to-first-token and total latency (ms). If the client
+    disconnects, the generator is cancelled and the backend request with it.
+    """
+    try:
+        camera_id, frame, instruction, max_tokens, settings = await parse_vision_request(request, instruction, camera_id)
+        frame_age_ms = round(frame.age * 1000, 1)
+        payload = build_stream_payload(await prepare_image(frame, settings), instruction, max_tokens)
+    except VisionRequestError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
         logger.error(f"Unhandled error: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+    async def events():
+        start = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        try:
+            logger.info("Sending streaming request to AI backend.")
+            async with backend_pool.stream(payload) as resp:
+                if resp.status_code >= 400:
+                    if resp.status_code >= 500:
+                        record_latency(AI_BACKEND_TIMEOUT)
+                    body = (await resp.aread()).decode("utf-8", "replace")
+                    logger.error(f"AI backend HTTP error: {resp.status_code} {body}")
+                    VISION_REQUESTS.labels("vision_stream", "502").inc()
+                    yield sse_event("error", {"error": f"AI backend error: {resp.status_code} {body}"})
+                    return
+                async for line in resp.aiter_lines():
+                    delta = parse_stream_line(line)
+                    if delta is STREAM_DONE:
+                        break
+                    if delta is None:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                        VISION_STAGE.labels("first_token").observe(first_token_ms / 1000)
+                        logger.info(f"First token after {first_token_ms:.0f} ms.")
+                    parts.append(delta)
+                    yield sse_event("delta", {"delta": delta})
+            total_ms = (time.perf_counter() - start) * 1000
+            text = "".join(parts)
+            record_latency(total_ms / 1000)
+            VISION_REQUESTS.labels("vision_stream", "200").inc()
+            logger.info(f"AI backend stream finished: first token {first_token_ms or 0:.0f} ms, total {total_ms:.0f} ms.")
+            if RESPONSE_CACHE_ENABLED and frame.dhash is not None:
+                response_cache.put(frame.dhash, (camera_id, instruction, max_tokens, settings), text)
+            record_history("vision_stream", camera_id, frame, instruction, max_tokens, settings, text, total_ms / 1000)
+            yield sse_event("done", {"response": text, "first_token_ms": first_token_ms, "total_ms": total_ms,
+                                     "frame_age_ms": frame_age_ms})
+        except asyncio.CancelledError:
+            logger.info("Client disconnected; cancelled AI backend stream.")
+            raise
+        except (BackendBusyError, NoBackendAvailableError) as e:
+            logger.warning(str(e))
+            record_latency(AI_BACKEND_TIMEOUT)
+            VISION_REQUESTS.labels("vision_stream", "503").inc()
+            yield sse_event("error", {"error": str(e)})
+        except Exception as e:
+            if isinstance(e, httpx.TransportError):
+                record_latency(AI_BACKEND_TIMEOUT)
+            logger.error(f"AI backend stream error: {e}")
+            VISION_REQUESTS.labels("vision_stream", "500").inc()
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Frame-Age-Ms": str(frame_age_ms)})
+
+def get_narrator(camera_id: str) -> Narrator:
+    narrator = narrators.get(camera_id)
+    if narrator is None:
+        camera = camera_registry.get(camera_id)
+
+        async def describe(frame: Frame) -> str:
+            settings, max_tokens = quality_level()
+            start = time.perf_counter()
+            text, cache_hit = await describe_cached(camera_id, frame, OPTIMIZED_PROMPT, max_tokens, settings)
+            record_history("narration", camera_id, frame, OPTIMIZED_PROMPT, max_tokens, settings, text, time.perf_counter() - start, cache_hit)
+            return text
+
+        narrator = Narrator(camera, describe, NARRATION_MIN_INTERVAL, NARRATION_MAX_INTERVAL, NARRATION_CHANGE_DISTANCE)
+        narrators[camera_id] = narrator
+    return narrator
+
+@app.websocket("/ws/narration")
+async def narration_socket(websocket: WebSocket, camera_id: str = DEFAULT_CAMERA_ID):
+    try:
+        narrator = get_narrator(camera_id)
+    except UnknownCameraError:
+        await websocket.close(code=1008, reason=f"Unknown camera: {camera_id}")
+        return
+    await websocket.accept()
+    sub = narrator.subscribe()
+
+    async def push():
+        while True:
+            await websocket.send_json(await sub.get())
+
+    async def drain():
+        # Narration is push-only; reading just tells us when the client goes away
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        narrator.unsubscribe(sub)
+
+def mjpeg_part(frame: Frame) -> bytes:
+    # Same part layout as camera-feed.ino so existing clients can point here unchanged
+    return b"--frame" + b"Content-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(frame.jpeg) + frame.jpeg
+
+@app.get("/stream")
+async def stream_endpoint(fps: Optional[float] = None, camera_id: str = DEFAULT_CAMERA_ID):
+    try:
+        camera = camera_registry.get(camera_id)
+    except UnknownCameraError:
+        return JSONResponse(status_code=404, content={"error": f"Unknown camera: {camera_id}"})
+    broadcaster = camera.broadcaster
+    sub = broadcaster.subscribe(STREAM_QUEUE_SIZE)
+    if camera.latest_frame is not None:
+        sub.offer(camera.latest_frame)
+    min_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+    async def frames():
+        last_sent = 0.0
+        try:
+            while True:
+                frame = await sub.get()
+                now = time.monotonic()
+                if now - last_sent < min_interval:
+                    continue
+                last_sent = now
+                yield mjpeg_part(frame)
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace;boundary=frame")
+
 @app.get("/status")
-def status():
-    # Consider ESP32 connected if a frame was uploaded in the last 10 seconds
-    now = time.time()
-    connected = latest_frame is not None and latest_frame_time is not None and (now - latest_frame_time) < 10
-    return {"esp32_connected": connected}
+def status(camera_id: str = DEFAULT_CAMERA_ID):
+    try:
+        camera = camera_registry.get(camera_id)
+    except UnknownCameraError:
+        return JSONResponse(status_code=404, content={"error": f"Unknown camera: {camera_id}"})
+    return {
+        "esp32_connected": camera.is_live(),
+        "cameras": camera_registry.stats(),
+        "vision_calls": vision_calls.stats(),
+        "response_cache": response_cache.stats(),
+        "quality": quality.stats() if QUALITY_CONTROL_ENABLED else None,
+        "ai_backends": backend_pool.stats() if backend_pool is not None else None,
+        "narration": {camera_id: narrator.stats() for camera_id, narrator in narrators.items()},
+        "recording": {camera_id: recorder.stats() for camera_id, recorder in recorders.items()},
+        "history": history.stats() if history is not None else None,
+    }
+
+@app.get("/history")
+def get_history(camera_id: Optional[str] = None, frame_hash: Optional[str] = None, since: Optional[float] = None,
+                until: Optional[float] = None, cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE):
+    """Stored descriptions, newest first. ``since``/``until`` are Unix timestamps;
+    pass the returned ``next`` as ``cursor`` to fetch the following page."""
+    if history is None:
+        return JSONResponse(status_code=404, content={"error": "History is disabled."})
+    try:
+        before = None
+        if cursor is not None:
+            timestamp, row_id = cursor.split(":")
+            before = (float(timestamp), int(row_id))
+        phash = int(frame_hash, 16) if frame_hash is not None else None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Invalid cursor or frame_hash."})
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        return JSONResponse(status_code=400, content={"error": f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}."})
+    items, next_before = history.query(camera_id, phash, since, until, before, limit)
+    return {"items": items, "next": f"{next_before[0]!r}:{next_before[1]}" if next_before is not None else None}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of ingest and vision metrics; gauges are sampled on scrape."""
+    for camera_id, camera in camera_registry.cameras.items():
+        CAMERA_CONNECTED.labels(camera_id).set(1 if camera.is_live() else 0)
+        if camera.latest_frame is not None:
+            CAMERA_FRAME_AGE.labels(camera_id).set(camera.latest_frame.age)
+    if backend_pool is not None:
+        for backend in backend_pool.backends:
+            BACKEND_IN_FLIGHT.labels(backend.url).set(backend.client.in_flight)
+            BACKEND_BREAKER_OPEN.labels(backend.url).set(0 if backend.breaker.state == "closed" else 1)
+    QUALITY_LEVEL.set(quality.level)
+    RESPONSE_CACHE_ENTRIES.set(response_cache.stats()["size"])
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/")
 def root():
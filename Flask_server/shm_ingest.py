@@ -0,0 +1,51 @@
+"""Single ingest process for multi-worker deployments.
+
+Connects to every camera in server.CAMERAS once and writes each frame into a
+shared-memory ring per camera. API workers started with
+INTELIGAZE_SHARED_MEMORY=1 read from those rings instead of opening their
+own ESP32 connections (see run_workers.bat).
+"""
+import asyncio
+
+from loguru import logger
+
+from server import CAMERAS, RECORD_FRAMES, SHM_SLOTS, SHM_SLOT_SIZE, start_recorder
+from cameras import CameraRegistry
+from shm_store import ShmFrameWriter, segment_name
+
+
+def ring_sink(camera_id, writer):
+    def write(frame):
+        if not writer.write(frame.jpeg, frame.timestamp):
+            logger.warning(f"[{camera_id}] Frame of {len(frame.jpeg)} bytes exceeds shared memory slot size {writer.slot_size}")
+    return write
+
+
+async def main():
+    registry = CameraRegistry()
+    writers = []
+    recorders = []
+    for camera_id, url in CAMERAS.items():
+        camera = registry.add(camera_id, url)
+        writer = ShmFrameWriter(segment_name(camera_id), SHM_SLOTS, SHM_SLOT_SIZE)
+        writers.append(writer)
+        camera.sinks.append(ring_sink(camera_id, writer))
+        logger.info(f"[{camera_id}] Writing frames to shared memory {segment_name(camera_id)}")
+        if RECORD_FRAMES:
+            recorders.append(start_recorder(camera))
+    await registry.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await registry.stop()
+        for writer in writers:
+            writer.close()
+        for recorder in recorders:
+            recorder.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,111 @@
+import struct
+import sys
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# Segment layout:
+#   header: magic, version, slot count, slot size, latest written sequence number
+#   slots:  [seq, timestamp, length, reserved] followed by up to slot_size bytes of JPEG
+# A slot's seq is zeroed while it is being written (seqlock), so readers can
+# detect and retry torn reads without any cross-process lock.
+_MAGIC = b"IGZF"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIIQ")
+_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<QdII")
+_WRITE_SEQ_OFFSET = 16
+
+
+def segment_name(camera_id: str) -> str:
+    return f"inteligaze_{camera_id}"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.platform != "win32":
+        # Readers must not unlink the writer's segment when they exit
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class ShmFrameWriter:
+    """Single-writer ring of the last ``slots`` frames of one camera."""
+
+    def __init__(self, name: str, slots: int = 8, slot_size: int = 512 * 1024):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = _SLOT_HEADER.size + slot_size
+        size = _HEADER_SIZE + slots * self.stride
+        try:
+            # Left behind by a previous ingest process that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.seq = 0
+        _HEADER.pack_into(self.shm.buf, 0, _MAGIC, _VERSION, slots, slot_size, 0)
+
+    def write(self, jpeg, timestamp: float) -> bool:
+        length = len(jpeg)
+        if length > self.slot_size:
+            return False
+        seq = self.seq + 1
+        offset = _HEADER_SIZE + (seq % self.slots) * self.stride
+        buf = self.shm.buf
+        _SLOT_HEADER.pack_into(buf, offset, 0, timestamp, length, 0)
+        start = offset + _SLOT_HEADER.size
+        buf[start:start + length] = jpeg
+        _SLOT_HEADER.pack_into(buf, offset, seq, timestamp, length, 0)
+        struct.pack_into("<Q", buf, _WRITE_SEQ_OFFSET, seq)
+        self.seq = seq
+        return True
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ShmFrameReader:
+    """Reads the newest frame from a ring written by another process."""
+
+    def __init__(self, name: str):
+        self.shm = _attach(name)
+        magic, version, self.slots, self.slot_size, _ = _HEADER.unpack_from(self.shm.buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.shm.close()
+            raise ValueError(f"Shared memory segment {name} is not an inteligaze frame ring")
+        self.stride = _SLOT_HEADER.size + self.slot_size
+
+    @property
+    def write_seq(self) -> int:
+        return struct.unpack_from("<Q", self.shm.buf, _WRITE_SEQ_OFFSET)[0]
+
+    def read_latest(self, last_seq: int = 0) -> Optional[Tuple[int, float, bytes]]:
+        """Return ``(seq, timestamp, jpeg)`` if the newest frame is not ``last_seq``.
+
+        The header and sequence checks work on the mapped segment directly;
+        the JPEG is copied out once so it stays valid after the writer
+        reuses the slot.
+        """
+        buf = self.shm.buf
+        for _ in range(3):
+            seq = self.write_seq
+            if seq == 0 or seq == last_seq:
+                return None
+            offset = _HEADER_SIZE + (seq % self.slots) * self.stride
+            slot_seq, timestamp, length, _ = _SLOT_HEADER.unpack_from(buf, offset)
+            if slot_seq != seq:
+                continue
+            start = offset + _SLOT_HEADER.size
+            jpeg = bytes(buf[start:start + length])
+            if _SLOT_HEADER.unpack_from(buf, offset)[0] == seq:
+                return seq, timestamp, jpeg
+        return None
+
+    def close(self):
+        self.shm.close()
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result instead of starting their own.
+    The work is shielded, so one impatient caller disconnecting does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._calls.get(key)
+        if fut is not None:
+            self.deduplicated += 1
+        else:
+            self.calls += 1
+            fut = asyncio.ensure_future(fn())
+            self._calls[key] = fut
+            fut.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(fut)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "deduplicated": self.deduplicated, "in_flight": len(self._calls)}
@@ -0,0 +1,141 @@
+"""Benchmark: tail latency of one backend vs a hedged, circuit-broken pool.
+
+Starts local mock backends whose latency is usually ``--base-ms`` but
+``--slow-pct`` percent of the time takes ``--slow-ms`` (a stalled GPU or
+a cold replica), plus an optional backend that always fails. Sends the
+same payload through a single BackendClient and through BackendPool and
+prints p50/p95/p99 for each.
+
+    python Test/bench_hedging.py [--requests 200] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Flask_server"))
+from backend_client import BackendClient
+from backend_pool import BackendPool
+
+
+def make_backend(base_ms, slow_ms, slow_pct, fail=False):
+    class MockBackend(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            if fail:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            slow = random.random() * 100 < slow_pct
+            time.sleep((slow_ms if slow else base_ms) / 1000)
+            body = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # hedged duplicate lost the race and was cancelled
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(client, payload, requests, concurrency):
+    latencies = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                resp = await client.post(payload)
+                resp.raise_for_status()
+            except Exception:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await client.start()
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        await client.close()
+    return latencies, errors
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--backends", type=int, default=2, help="healthy mock backends in the pool")
+    ap.add_argument("--base-ms", type=float, default=50)
+    ap.add_argument("--slow-ms", type=float, default=1000)
+    ap.add_argument("--slow-pct", type=float, default=5, help="percent of requests that take --slow-ms")
+    ap.add_argument("--failing", action="store_true", help="add a backend that always returns 503")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    urls = [make_backend(args.base_ms, args.slow_ms, args.slow_pct) for _ in range(args.backends)]
+    pool_backends = [(url, 1.0) for url in urls]
+    if args.failing:
+        pool_backends.append((make_backend(0, 0, 0, fail=True), 1.0))
+    payload = {"max_tokens": 10, "messages": [{"role": "user", "content": "bench"}]}
+
+    runs = [
+        ("single backend", BackendClient(urls[0])),
+        ("pool, no hedging", BackendPool(pool_backends, hedge=False)),
+        ("pool, hedged", BackendPool(pool_backends, hedge_min_delay=args.base_ms * 2 / 1000)),
+    ]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.slow_pct:g}% at {args.slow_ms:g} ms, otherwise {args.base_ms:g} ms")
+    print(f"{'client':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'hedged':>7}")
+    results = []
+    for name, client in runs:
+        latencies, errors = await run(client, payload, args.requests, args.concurrency)
+        hedged = client.hedged if isinstance(client, BackendPool) else 0
+        row = {
+            "client": name,
+            "p50_ms": percentile(latencies, 0.5) if latencies else None,
+            "p95_ms": percentile(latencies, 0.95) if latencies else None,
+            "p99_ms": percentile(latencies, 0.99) if latencies else None,
+            "mean_ms": statistics.mean(latencies) if latencies else None,
+            "errors": errors,
+            "hedged": hedged,
+        }
+        if isinstance(client, BackendPool):
+            row["backends"] = client.stats()["backends"]
+        results.append(row)
+        if latencies:
+            print(f"{name:<20} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {errors:>7} {hedged:>7}")
+        else:
+            print(f"{name:<20} {'-':>8} {'-':>8} {'-':>8} {errors:>7} {hedged:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
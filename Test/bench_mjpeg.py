@@ -0,0 +1,92 @@
+"""Micro-benchmark: shared.mjpeg.MJPEGParser vs. the old `bytes +=` / find() loop.
+
+Builds a synthetic multipart stream shaped like camera-feed.ino output and
+times both parsers over it at several ESP32-CAM resolutions.
+
+    python Test/bench_mjpeg.py [--frames 60] [--chunk 1024]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.mjpeg import MJPEGParser
+
+# (name, width, height); JPEG size is approximated at ~0.1 byte per pixel
+RESOLUTIONS = [
+    ("VGA", 640, 480),
+    ("SVGA", 800, 600),
+    ("XGA", 1024, 768),
+    ("HD", 1280, 720),
+    ("UXGA", 1600, 1200),
+]
+
+
+def fake_jpeg(size, rng):
+    # SOI, APP0, SOS header, entropy data without 0xFF (as if byte-stuffed), EOI
+    app0 = b'\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    sos = b'\xff\xda\x00\x0c\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00'
+    body = bytes(rng.randrange(0, 255) for _ in range(size))
+    return b'\xff\xd8' + app0 + sos + body + b'\xff\xd9'
+
+
+def build_stream(frame, count):
+    part = b'--frame' + b'Content-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(frame) + frame
+    return part * count
+
+
+def legacy_parse(chunks):
+    frames = 0
+    bytes_data = b''
+    for chunk in chunks:
+        bytes_data += chunk
+        a = bytes_data.find(b'\xff\xd8')
+        b = bytes_data.find(b'\xff\xd9')
+        if a != -1 and b != -1:
+            jpg = bytes_data[a:b+2]
+            bytes_data = bytes_data[b+2:]
+            frames += 1
+    return frames
+
+
+def parser_parse(chunks):
+    frames = 0
+    parser = MJPEGParser()
+    for chunk in chunks:
+        frames += len(parser.feed(chunk))
+    return frames
+
+
+def bench(fn, chunks, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=60)
+    ap.add_argument("--chunk", type=int, default=1024)
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'res':<6} {'jpeg KB':>8} {'legacy ms/f':>12} {'parser ms/f':>12} {'speedup':>8}")
+    for name, w, h in RESOLUTIONS:
+        frame = fake_jpeg(w * h // 10, rng)
+        stream = build_stream(frame, args.frames)
+        chunks = [stream[i:i + args.chunk] for i in range(0, len(stream), args.chunk)]
+        t_old, n_old = bench(legacy_parse, chunks)
+        t_new, n_new = bench(parser_parse, chunks)
+        assert n_old == n_new == args.frames, (n_old, n_new)
+        per_old = t_old / args.frames * 1000
+        per_new = t_new / args.frames * 1000
+        print(f"{name:<6} {len(frame) / 1024:>8.1f} {per_old:>12.3f} {per_new:>12.3f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
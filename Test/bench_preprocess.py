@@ -0,0 +1,111 @@
+"""Benchmark: payload size and end-to-end latency per preprocessing setting.
+
+Runs a local mock OpenAI-compatible backend whose response time grows with
+the request size (a stand-in for upload time plus image-dependent inference),
+then sends the same frame through each PreprocessSettings in turn.
+
+    python Test/bench_preprocess.py [--image Test/image.png] [--requests 10]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.frame import Frame
+from shared.payload import build_vision_payload
+from shared.preprocess import PreprocessSettings
+
+SETTINGS = [
+    PreprocessSettings(),
+    PreprocessSettings(quality=70),
+    PreprocessSettings(max_edge=768, quality=80),
+    PreprocessSettings(max_edge=512, quality=70),
+    PreprocessSettings(max_edge=512, quality=70, grayscale=True),
+    PreprocessSettings(max_edge=384, quality=60),
+    PreprocessSettings(max_edge=512, quality=70, crop=0.7),
+]
+
+
+def make_backend(base_ms, ms_per_kb):
+    class MockBackend(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            self.rfile.read(length)
+            time.sleep((base_ms + ms_per_kb * length / 1024) / 1000)
+            body = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--image", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "image.png"))
+    ap.add_argument("--requests", type=int, default=10)
+    ap.add_argument("--base-ms", type=float, default=50, help="mock backend fixed latency")
+    ap.add_argument("--ms-per-kb", type=float, default=0.5, help="mock backend latency per KB of request")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        sys.exit(f"Cannot read {args.image}")
+    jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    server = make_backend(args.base_ms, args.ms_per_kb)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    session = requests.Session()
+
+    print(f"source {image.shape[1]}x{image.shape[0]}, {len(jpeg) / 1024:.1f} KB JPEG")
+    print(f"{'settings':<45} {'jpeg KB':>8} {'body KB':>8} {'prep ms':>8} {'e2e ms':>8}")
+    results = []
+    for settings in SETTINGS:
+        latencies = []
+        prep_times = []
+        for _ in range(args.requests):
+            # A fresh Frame per request so caching doesn't hide the preprocessing cost
+            frame = Frame(jpeg)
+            start = time.perf_counter()
+            data_url = frame.encoded_data_url(settings)
+            body = json.dumps(build_vision_payload(data_url, "Describe the scene."))
+            prepared = time.perf_counter()
+            resp = session.post(url, data=body, headers={"Content-Type": "application/json"})
+            resp.raise_for_status()
+            done = time.perf_counter()
+            prep_times.append((prepared - start) * 1000)
+            latencies.append((done - start) * 1000)
+        row = {
+            "settings": settings.describe(),
+            "jpeg_bytes": len(frame.encode(settings)),
+            "body_bytes": len(body),
+            "prep_ms": sum(prep_times) / len(prep_times),
+            "e2e_ms": sum(latencies) / len(latencies),
+        }
+        results.append(row)
+        print(f"{row['settings']:<45} {row['jpeg_bytes'] / 1024:>8.1f} {row['body_bytes'] / 1024:>8.1f} "
+              f"{row['prep_ms']:>8.2f} {row['e2e_ms']:>8.1f}")
+    server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
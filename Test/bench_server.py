@@ -0,0 +1,319 @@
+"""Load and latency benchmark for the FastAPI server, no camera or GPU needed.
+
+Starts three local processes/threads:
+  * a fake ESP32 that streams multipart JPEG exactly like camera-feed.ino
+    (``--fps``, ``--resolution``, ``--jitter-ms``, ``--disconnect-every``),
+  * a mock OpenAI-compatible backend with lognormal latency
+    (``--backend-ms``, ``--backend-sigma``) that also streams SSE deltas,
+  * Flask_server/server.py under uvicorn, pointed at both.
+Then drives POST /vision at each ``--concurrency`` level for ``--duration``
+seconds and reports throughput, p50/p95/p99, ingest fps and server CPU per
+ingested frame. ``--json`` saves everything for comparison between versions.
+
+    python Test/bench_server.py --concurrency 1,4,16 --duration 10 --json bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import httpx
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FLASK_DIR = os.path.join(ROOT, "Flask_server")
+
+# ESP32-CAM frame sizes
+RESOLUTIONS = {"QQVGA": (160, 120), "QVGA": (320, 240), "VGA": (640, 480), "SVGA": (800, 600),
+               "XGA": (1024, 768), "HD": (1280, 720), "UXGA": (1600, 1200)}
+
+SERVER_BOOT = """
+import os, sys
+sys.path.insert(0, {flask_dir!r})
+os.chdir({flask_dir!r})
+import server, uvicorn
+server.CAMERAS = {{server.DEFAULT_CAMERA_ID: {camera_url!r}}}
+server.AI_BACKENDS = [({backend_url!r}, 1.0)]
+server.RESPONSE_CACHE_ENABLED = {cache!r}
+server.QUALITY_CONTROL_ENABLED = {quality!r}
+uvicorn.run(server.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_frames(width, height, count=30, quality=12):
+    """A moving scene so consecutive frames (and their dHashes) differ."""
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC)
+    frames = []
+    for i in range(count):
+        image = background.copy()
+        x = int((width - width // 4) * i / count)
+        cv2.rectangle(image, (x, height // 3), (x + width // 4, height // 3 * 2), (255, 255, 255), -1)
+        # camera-feed.ino's jpeg_quality is 0-63 with lower = better; map to OpenCV's 0-100
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, max(10, 100 - quality)])
+        frames.append(jpeg.tobytes())
+    return frames
+
+
+def start_fake_esp32(frames, fps, jitter_ms, disconnect_every):
+    class FakeESP32(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            # Same framing as stream_handler() in camera-feed.ino
+            self.send_response(200)
+            self.send_header("Content-Type", "multipart/x-mixed-replace;boundary=frame")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            connected_at = time.monotonic()
+            i = 0
+            try:
+                while True:
+                    jpeg = frames[i % len(frames)]
+                    self.wfile.write(b"--frame")
+                    self.wfile.write(b"Content-Type: image/jpeg\r\nContent-Length: %u\r\n\r\n" % len(jpeg))
+                    self.wfile.write(jpeg)
+                    self.wfile.flush()
+                    i += 1
+                    if disconnect_every and time.monotonic() - connected_at >= disconnect_every:
+                        return
+                    delay = 1.0 / fps + random.uniform(-jitter_ms, jitter_ms) / 1000
+                    time.sleep(max(delay, 0))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeESP32)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def start_mock_backend(median_ms, sigma, tokens, token_ms):
+    class MockBackend(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(median_ms / 1000 * random.lognormvariate(0, sigma))
+            words = ["word"] * tokens
+            try:
+                if request.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for word in words:
+                        event = b"data: " + json.dumps({"choices": [{"delta": {"content": word + " "}}]}).encode() + b"\n\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                        self.wfile.flush()
+                        time.sleep(token_ms / 1000)
+                    done = b"data: [DONE]\n\n"
+                    self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(done), done))
+                    return
+                time.sleep(token_ms * tokens / 1000)
+                body = json.dumps({"choices": [{"message": {"content": " ".join(words)}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockBackend)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def process_cpu_seconds(pid):
+    if psutil is not None:
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError):
+        return None
+
+
+def scrape_counter(text, name, labels):
+    match = re.search(rf"^{re.escape(name)}{{{re.escape(labels)}}} (\S+)$", text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def fmt(value, width, decimals=0):
+    return f"{value:>{width}.{decimals}f}" if value is not None else "-".rjust(width)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def wait_for_server(client, base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status = (await client.get(f"{base_url}/status")).json()
+            if status.get("esp32_connected"):
+                return status
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start or never received a camera frame")
+
+
+async def drive(client, base_url, concurrency, duration, unique_instructions):
+    latencies = []
+    statuses = {}
+    cache_hits = 0
+    stop_at = time.monotonic() + duration
+    counter = 0
+
+    async def worker():
+        nonlocal cache_hits, counter
+        while time.monotonic() < stop_at:
+            counter += 1
+            body = {"instruction": f"Describe the scene. ({counter})" if unique_instructions else "Describe the scene."}
+            start = time.perf_counter()
+            try:
+                resp = await client.post(f"{base_url}/vision", json=body)
+                status = str(resp.status_code)
+                if resp.headers.get("X-Cache") == "hit":
+                    cache_hits += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "200":
+                latencies.append(elapsed * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, cache_hits
+
+
+async def run_level(client, base_url, pid, concurrency, args):
+    before = (await client.get(f"{base_url}/metrics")).text
+    cpu_before = process_cpu_seconds(pid)
+    start = time.perf_counter()
+    latencies, statuses, cache_hits = await drive(client, base_url, concurrency, args.duration, not args.cache)
+    wall = time.perf_counter() - start
+    cpu_after = process_cpu_seconds(pid)
+    after = (await client.get(f"{base_url}/metrics")).text
+    frames = (scrape_counter(after, "inteligaze_ingest_frames_total", 'camera="default"')
+              - scrape_counter(before, "inteligaze_ingest_frames_total", 'camera="default"'))
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "concurrency": concurrency,
+        "requests": sum(statuses.values()),
+        "statuses": statuses,
+        "cache_hits": cache_hits,
+        "throughput_rps": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 0.5) if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) if latencies else None,
+        "max_ms": max(latencies) if latencies else None,
+        "ingest_fps": frames / wall,
+        "server_cpu_percent": cpu / wall * 100 if cpu is not None else None,
+        "server_cpu_ms_per_frame": cpu / frames * 1000 if cpu is not None and frames else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", default="1,4,16", help="comma-separated client concurrency levels")
+    ap.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    ap.add_argument("--fps", type=float, default=20)
+    ap.add_argument("--resolution", default="VGA", choices=RESOLUTIONS)
+    ap.add_argument("--jpeg-quality", type=int, default=12, help="ESP32 jpeg_quality (0-63, lower is better)")
+    ap.add_argument("--jitter-ms", type=float, default=10, help="uniform jitter added to the frame interval")
+    ap.add_argument("--disconnect-every", type=float, default=0, help="drop the camera connection every N seconds")
+    ap.add_argument("--backend-ms", type=float, default=300, help="median backend latency before the answer")
+    ap.add_argument("--backend-sigma", type=float, default=0.3, help="lognormal sigma of the backend latency")
+    ap.add_argument("--tokens", type=int, default=20, help="tokens per answer")
+    ap.add_argument("--token-ms", type=float, default=10, help="generation time per token")
+    ap.add_argument("--cache", action="store_true", help="let the response cache serve repeated requests")
+    ap.add_argument("--adaptive-quality", action="store_true", help="leave the adaptive quality controller on")
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    width, height = RESOLUTIONS[args.resolution]
+    frames = make_frames(width, height, quality=args.jpeg_quality)
+    camera_url = start_fake_esp32(frames, args.fps, args.jitter_ms, args.disconnect_every)
+    backend_url = start_mock_backend(args.backend_ms, args.backend_sigma, args.tokens, args.token_ms)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    boot = SERVER_BOOT.format(flask_dir=os.path.abspath(FLASK_DIR), camera_url=camera_url, backend_url=backend_url,
+                              cache=args.cache, quality=args.adaptive_quality, port=port)
+    server = subprocess.Popen([sys.executable, "-c", boot], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(levels) + 2, max_keepalive_connections=max(levels) + 2)
+        async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+            await wait_for_server(client, base_url)
+            print(f"{args.resolution} {width}x{height} @ {args.fps:g} fps, ~{sum(map(len, frames)) / len(frames) / 1024:.0f} KB/frame; "
+                  f"backend {args.backend_ms:g} ms (sigma {args.backend_sigma:g}) + {args.tokens}x{args.token_ms:g} ms")
+            print(f"{'conc':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ingest fps':>11} {'CPU %':>6} {'CPU ms/frame':>13}  statuses")
+            for concurrency in levels:
+                row = await run_level(client, base_url, server.pid, concurrency, args)
+                results.append(row)
+                print(f"{concurrency:>5} {row['throughput_rps']:>7.2f} {fmt(row['p50_ms'], 8)} {fmt(row['p95_ms'], 8)} "
+                      f"{fmt(row['p99_ms'], 8)} {row['ingest_fps']:>11.1f} {fmt(row['server_cpu_percent'], 6)} "
+                      f"{fmt(row['server_cpu_ms_per_frame'], 13, 2)}  {row['statuses']}")
+            final_status = (await client.get(f"{base_url}/status")).json()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "revision": git_revision(),
+                "timestamp": time.time(),
+                "args": vars(args),
+                "results": results,
+                "final_status": final_status,
+            }, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Flask_server"))
+from backend_pool import BackendPool
+
+
+def slow_pool(urls, delay=0.3, **kwargs):
+    """Pool whose backends answer after ``delay`` seconds (or ``delay[url]``)."""
+    pool = BackendPool([(url, 1.0) for url in urls], hedge=True, hedge_initial_delay=0.01, hedge_min_delay=0.01, **kwargs)
+
+    def answer_after(seconds):
+        async def post(payload):
+            await asyncio.sleep(seconds)
+            return httpx.Response(200, json={"ok": True}, request=httpx.Request("POST", "http://backend"))
+        return post
+
+    for backend in pool.backends:
+        backend.client.post = answer_after(delay[backend.url] if isinstance(delay, dict) else delay)
+    picks = []
+    pick = pool._pick
+    pool._pick = lambda exclude=None: picks.append(exclude) or pick(exclude)
+    return pool, picks
+
+
+def test_single_backend_does_not_spin_waiting_to_hedge():
+    pool, picks = slow_pool(["http://a/v1/chat/completions"])
+    resp = asyncio.run(pool.post({}))
+    assert resp.status_code == 200
+    assert len(picks) == 1
+    assert pool.hedged == 0
+
+
+def test_hedges_once_past_the_delay():
+    pool, picks = slow_pool(["http://a/v1/chat/completions", "http://b/v1/chat/completions"])
+    resp = asyncio.run(pool.post({}))
+    assert resp.status_code == 200
+    assert len(picks) == 2
+    assert pool.hedged == 1
+
+
+def test_open_breaker_on_the_only_secondary_disables_hedging():
+    pool, picks = slow_pool(["http://a/v1/chat/completions", "http://b/v1/chat/completions"])
+    for backend in pool.backends:
+        if backend.url.startswith("http://b"):
+            for _ in range(backend.breaker.failure_threshold):
+                backend.breaker.record_failure()
+    asyncio.run(pool.post({}))
+    assert len(picks) == 1
+    assert pool.hedged == 0
+
+
+def test_probe_that_loses_a_hedge_race_is_released():
+    a, b = "http://a/v1/chat/completions", "http://b/v1/chat/completions"
+    pool, _ = slow_pool([a, b], delay={a: 0.05, b: 1.0}, cooldown=0.0)
+    probed = next(backend for backend in pool.backends if backend.url == b)
+    for _ in range(probed.breaker.failure_threshold):
+        probed.breaker.record_failure()
+    # Make the half-open backend the primary so its probe is the request that gets hedged and cancelled
+    probed.weight = 1e9
+    asyncio.run(pool.post({}))
+    assert pool.hedged == 1
+    assert probed.breaker.state == "half_open"
+    assert probed.breaker.allow()
+
+
+if __name__ == "__main__":
+    test_single_backend_does_not_spin_waiting_to_hedge()
+    test_hedges_once_past_the_delay()
+    test_open_breaker_on_the_only_secondary_disables_hedging()
+    test_probe_that_loses_a_hedge_race_is_released()
+    print("ok")
@@ -0,0 +1 @@
+# Helpers shared by the FastAPI server (Flask_server/) and the desktop app (Desktop/)
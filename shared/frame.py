@@ -0,0 +1,158 @@
+import base64
+import hashlib
+import threading
+import time
+
+from shared.mjpeg import SOI, EOI
+from shared.preprocess import preprocess, encode_jpeg
+
+
+def is_complete_jpeg(jpeg):
+    """Cheap validity check: SOI at the start and EOI at the end, no decoding."""
+    return len(jpeg) > 4 and jpeg[:2] == SOI and jpeg[-2:] == EOI
+
+
+class Frame:
+    """A JPEG frame from the camera plus artifacts derived from it on demand.
+
+    Ingest only wraps the raw bytes. The base64 data URL, the decoded image and
+    thumbnails are computed the first time a consumer asks for them and then
+    reused, so a frame nobody looks at costs nothing beyond the copy off the
+    wire. cv2/numpy are imported only when pixels are actually needed.
+    """
+
+    __slots__ = ("jpeg", "timestamp", "seq", "_lock", "_data_url", "_image", "_thumbnails", "_dhash", "_content_hash", "_sharpness", "_encoded", "_data_urls")
+
+    def __init__(self, jpeg, timestamp=None, seq=0):
+        self.jpeg = jpeg
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.seq = seq
+        self._lock = threading.Lock()
+        self._data_url = None
+        self._image = None
+        self._thumbnails = {}
+        self._dhash = None
+        self._content_hash = None
+        self._sharpness = None
+        self._encoded = {}
+        self._data_urls = {}
+
+    def __len__(self):
+        return len(self.jpeg)
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+    @property
+    def data_url(self):
+        if self._data_url is None:
+            with self._lock:
+                if self._data_url is None:
+                    image_b64 = base64.b64encode(self.jpeg).decode("utf-8")
+                    self._data_url = f"data:image/jpeg;base64,{image_b64}"
+        return self._data_url
+
+    @property
+    def image(self):
+        """Decoded BGR ndarray, or None if the JPEG is corrupt."""
+        if self._image is None:
+            with self._lock:
+                if self._image is None:
+                    import cv2
+                    import numpy as np
+                    self._image = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return self._image
+
+    def encode(self, settings=None):
+        """JPEG bytes to send onward, prepared per ``PreprocessSettings``.
+
+        With no settings (or passthrough ones) this is the camera's original
+        JPEG: no re-encode and no second generation of compression artifacts.
+        Otherwise the processed bytes are cached per settings.
+        """
+        if settings is None or settings.passthrough:
+            return self.jpeg
+        encoded = self._encoded.get(settings)
+        if encoded is None:
+            image = self.image
+            if image is None:
+                return None
+            encoded = encode_jpeg(preprocess(image, settings), settings.quality)
+            if encoded is None:
+                return None
+            with self._lock:
+                self._encoded[settings] = encoded
+        return encoded
+
+    def encoded_data_url(self, settings=None):
+        if settings is None or settings.passthrough:
+            return self.data_url
+        url = self._data_urls.get(settings)
+        if url is None:
+            encoded = self.encode(settings)
+            if encoded is None:
+                return None
+            url = f"data:image/jpeg;base64,{base64.b64encode(encoded).decode('utf-8')}"
+            with self._lock:
+                self._data_urls[settings] = url
+        return url
+
+    def thumbnail(self, max_edge=160):
+        thumb = self._thumbnails.get(max_edge)
+        if thumb is None:
+            image = self.image
+            if image is None:
+                return None
+            import cv2
+            with self._lock:
+                thumb = self._thumbnails.get(max_edge)
+                if thumb is None:
+                    h, w = image.shape[:2]
+                    scale = min(1.0, max_edge / max(h, w))
+                    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+                    thumb = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                    self._thumbnails[max_edge] = thumb
+        return thumb
+
+    @property
+    def dhash(self):
+        """64-bit difference hash of the frame, or None if the JPEG is corrupt.
+
+        Decodes at 1/8 scale straight to grayscale, so it stays cheap even when
+        the full-size image has never been decoded.
+        """
+        if self._dhash is None:
+            import cv2
+            import numpy as np
+            gray = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if gray is None:
+                return None
+            small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+            bits = (small[:, 1:] > small[:, :-1]).flatten()
+            self._dhash = int.from_bytes(np.packbits(bits).tobytes(), "big")
+        return self._dhash
+
+    @property
+    def content_hash(self):
+        """64-bit BLAKE2b digest of the JPEG bytes: equal only for byte-identical frames."""
+        if self._content_hash is None:
+            self._content_hash = int.from_bytes(hashlib.blake2b(self.jpeg, digest_size=8).digest(), "big")
+        return self._content_hash
+
+    @property
+    def sharpness(self):
+        """Focus measure: variance of the Laplacian, or None if the JPEG is corrupt.
+
+        Computed on a 1/4-scale grayscale decode; motion blur flattens edges
+        and pulls the value down. Only comparable between frames of the same
+        camera and resolution.
+        """
+        if self._sharpness is None:
+            import cv2
+            import numpy as np
+            gray = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if gray is None:
+                return None
+            self._sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        return self._sharpness
@@ -0,0 +1,179 @@
+import re
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+_HEADER_END = b'\r\n\r\n'
+_CONTENT_LENGTH = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+# Don't let junk between parts grow the buffer without bound
+_MAX_HEADER_BYTES = 4096
+
+_HEADERS, _BODY, _SCAN = range(3)
+
+
+class MJPEGParser:
+    """Incremental parser for multipart/x-mixed-replace MJPEG streams.
+
+    Feed it raw chunks as they arrive and it returns every JPEG completed by
+    that chunk. Parts that carry a Content-Length header (camera-feed.ino
+    sends one) are copied straight into a preallocated buffer with no
+    searching at all. Streams without part headers fall back to walking the
+    JPEG segment structure, which resumes where the previous chunk stopped
+    and skips over embedded EXIF thumbnails rather than stopping at their EOI.
+
+    Frames are returned as ``bytearray`` objects owned by the caller, so they
+    can be wrapped with ``memoryview`` or ``np.frombuffer`` without a copy.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._state = _HEADERS
+        self._frame = None
+        self._filled = 0
+        self._scan_pos = 2
+        self._in_entropy = False
+        self._naive = False
+
+    def reset(self):
+        self.__init__()
+
+    def feed(self, chunk):
+        frames = []
+        data = memoryview(chunk)
+        while True:
+            if self._state == _BODY:
+                if not data.nbytes:
+                    break
+                data = self._fill(data, frames)
+                continue
+            if data.nbytes:
+                self._buf += data
+                data = data[:0]
+            if self._state == _HEADERS:
+                progressed = self._parse_headers(frames)
+            else:
+                progressed = self._scan(frames)
+            if not progressed:
+                break
+        return frames
+
+    def _fill(self, data, frames):
+        n = min(len(self._frame) - self._filled, data.nbytes)
+        self._frame[self._filled:self._filled + n] = data[:n]
+        self._filled += n
+        if self._filled == len(self._frame):
+            frames.append(self._frame)
+            self._frame = None
+            self._state = _HEADERS
+        return data[n:]
+
+    def _parse_headers(self, frames):
+        buf = self._buf
+        end = buf.find(_HEADER_END)
+        soi = buf.find(SOI, 0, end if end != -1 else len(buf))
+        if soi != -1:
+            # JPEG data without part headers
+            del buf[:soi]
+            self._begin_scan()
+            return True
+        if end == -1:
+            if len(buf) > _MAX_HEADER_BYTES:
+                # Keep a tail in case a terminator straddles two chunks
+                del buf[:-3]
+            return False
+        match = _CONTENT_LENGTH.search(buf, 0, end)
+        length = int(match.group(1)) if match else None
+        del buf[:end + len(_HEADER_END)]
+        if length is None:
+            self._begin_scan()
+            return bool(buf)
+        self._frame = bytearray(length)
+        self._filled = 0
+        self._state = _BODY
+        if buf:
+            with memoryview(buf) as view:
+                rest = self._fill(view, frames)
+                consumed = view.nbytes - rest.nbytes
+                rest.release()
+            del buf[:consumed]
+        return True
+
+    def _begin_scan(self):
+        self._state = _SCAN
+        self._scan_pos = 2
+        self._in_entropy = False
+        self._naive = False
+
+    def _scan(self, frames):
+        buf = self._buf
+        if len(buf) < 2 or buf[0:2] != SOI:
+            start = buf.find(SOI)
+            if start == -1:
+                del buf[:-1]
+                return False
+            del buf[:start]
+            self._begin_scan()
+        end = self._find_end()
+        if end == -1:
+            return False
+        frames.append(buf[:end])
+        del buf[:end]
+        self._state = _HEADERS
+        return True
+
+    def _find_end(self):
+        # Returns the offset just past EOI, or -1 after saving where to resume
+        buf = self._buf
+        n = len(buf)
+        pos = self._scan_pos
+        while True:
+            if self._naive:
+                i = buf.find(EOI, pos)
+                if i == -1:
+                    self._scan_pos = max(pos, n - 1)
+                    return -1
+                return i + 2
+            if self._in_entropy:
+                # Entropy-coded data ends at the first real marker; 0xFF00 is
+                # a stuffed byte and RSTn markers belong to the scan.
+                while True:
+                    pos = buf.find(0xFF, pos)
+                    if pos == -1 or pos + 1 >= n:
+                        self._scan_pos = n if pos == -1 else pos
+                        return -1
+                    m = buf[pos + 1]
+                    if m == 0x00 or 0xD0 <= m <= 0xD7:
+                        pos += 2
+                    elif m == 0xFF:
+                        pos += 1
+                    else:
+                        break
+                self._in_entropy = False
+            if pos + 2 > n:
+                self._scan_pos = pos
+                return -1
+            if buf[pos] != 0xFF:
+                # Not a well-formed segment chain, just look for EOI
+                self._naive = True
+                continue
+            m = buf[pos + 1]
+            if m == 0xFF:
+                pos += 1
+            elif m == 0xD9:
+                return pos + 2
+            elif m == 0x01 or 0xD0 <= m <= 0xD8:
+                pos += 2
+            else:
+                if pos + 4 > n:
+                    self._scan_pos = pos
+                    return -1
+                pos += 2 + ((buf[pos + 2] << 8) | buf[pos + 3])
+                if m == 0xDA:
+                    self._in_entropy = True
+
+
+def iter_frames(chunks, parser=None):
+    """Yield complete JPEG frames from an iterable of raw stream chunks."""
+    parser = parser or MJPEGParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
@@ -0,0 +1,49 @@
+import json
+
+DEFAULT_MAX_TOKENS = 100
+
+
+def build_vision_payload(image_data_url, instruction, max_tokens=DEFAULT_MAX_TOKENS):
+    """OpenAI-compatible chat completion request for one image and instruction."""
+    return {
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": instruction},
+                    {"type": "image_url", "image_url": {"url": image_data_url}}
+                ]
+            }
+        ]
+    }
+
+
+def extract_content(data):
+    return data["choices"][0]["message"]["content"]
+
+
+def build_stream_payload(image_data_url, instruction, max_tokens=DEFAULT_MAX_TOKENS):
+    payload = build_vision_payload(image_data_url, instruction, max_tokens)
+    payload["stream"] = True
+    return payload
+
+
+STREAM_DONE = object()
+
+
+def parse_stream_line(line):
+    """Parse one line of an OpenAI-style SSE completion stream.
+
+    Returns the text delta, ``STREAM_DONE`` at the end of the stream, or None
+    for lines that carry no text (comments, role-only chunks, keep-alives).
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return STREAM_DONE
+    if not data:
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or None
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, fields
+from typing import Optional, Tuple
+
+DEFAULT_JPEG_QUALITY = 90
+
+
+@dataclass(frozen=True)
+class PreprocessSettings:
+    """How a frame is prepared before it is base64-encoded for the backend.
+
+    ``crop`` is either ``None``, a centre-crop fraction (``0.6`` keeps the
+    middle 60% of each side) or an ``(x, y, w, h)`` ROI in fractions of the
+    frame. With every field at its default the camera's JPEG is sent as-is.
+    Instances are hashable so they can key per-frame encode caches.
+    """
+
+    max_edge: Optional[int] = None
+    quality: Optional[int] = None
+    grayscale: bool = False
+    crop: Optional[object] = None
+
+    @property
+    def passthrough(self) -> bool:
+        return self.max_edge is None and self.quality is None and not self.grayscale and self.crop is None
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "PreprocessSettings":
+        if not data:
+            return cls()
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown preprocess settings: {', '.join(sorted(unknown))}")
+        values = dict(data)
+        for name, low, high in (("max_edge", 1, None), ("quality", 1, 100)):
+            value = values.get(name)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"{name} must be an integer")
+            if value < low or (high is not None and value > high):
+                raise ValueError(f"{name} must be between {low} and {high}" if high else f"{name} must be at least {low}")
+        if not isinstance(values.get("grayscale", False), bool):
+            raise ValueError("grayscale must be true or false")
+        values["crop"] = _parse_crop(values.get("crop"))
+        return cls(**values)
+
+    def describe(self) -> str:
+        if self.passthrough:
+            return "passthrough"
+        parts = []
+        if self.max_edge is not None:
+            parts.append(f"max_edge={self.max_edge}")
+        if self.quality is not None:
+            parts.append(f"quality={self.quality}")
+        if self.grayscale:
+            parts.append("grayscale")
+        if self.crop is not None:
+            parts.append(f"crop={self.crop}")
+        return ",".join(parts)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _parse_crop(crop):
+    """Validate a crop from JSON: None, a fraction in (0, 1], or [x, y, w, h] fractions inside the frame."""
+    if crop is None:
+        return None
+    if _is_number(crop):
+        if not 0 < crop <= 1:
+            raise ValueError("crop fraction must be in (0, 1]")
+        return crop
+    if not isinstance(crop, (list, tuple)) or len(crop) != 4 or not all(_is_number(v) for v in crop):
+        raise ValueError("crop must be a fraction or [x, y, w, h]")
+    x, y, w, h = crop
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 and 0 < h <= 1 and x + w <= 1 + 1e-9 and y + h <= 1 + 1e-9):
+        raise ValueError("crop [x, y, w, h] must lie within [0, 1]")
+    return tuple(crop)
+
+
+def _crop_box(shape, crop) -> Tuple[int, int, int, int]:
+    h, w = shape[:2]
+    if isinstance(crop, (int, float)):
+        fx = fy = 1.0 - float(crop)
+        x, y, cw, ch = fx / 2, fy / 2, float(crop), float(crop)
+    else:
+        x, y, cw, ch = crop
+    x0, y0 = int(x * w), int(y * h)
+    x1, y1 = min(w, x0 + max(1, int(cw * w))), min(h, y0 + max(1, int(ch * h)))
+    return x0, y0, x1, y1
+
+
+def preprocess(image, settings: PreprocessSettings):
+    """Apply crop, grayscale and downscale (in that order) to a BGR image."""
+    import cv2
+
+    if settings.crop is not None:
+        x0, y0, x1, y1 = _crop_box(image.shape, settings.crop)
+        image = image[y0:y1, x0:x1]
+    if settings.grayscale and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = image.shape[:2]
+    if settings.max_edge is not None and max(h, w) > settings.max_edge:
+        scale = settings.max_edge / max(h, w)
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def encode_jpeg(image, quality: Optional[int] = None) -> Optional[bytes]:
+    import cv2
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality if quality is not None else DEFAULT_JPEG_QUALITY]
+    ok, buffer = cv2.imencode('.jpg', image, params)
+    return buffer.tobytes() if ok else None
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import deque
+
+from shared.payload import DEFAULT_MAX_TOKENS
+from shared.preprocess import PreprocessSettings
+
+# Best quality first. Each step down shrinks the upload and the generated
+# answer, the two costs we control on our side of the backend.
+DEFAULT_LADDER = [
+    (PreprocessSettings(), DEFAULT_MAX_TOKENS),
+    (PreprocessSettings(max_edge=1024, quality=85), DEFAULT_MAX_TOKENS),
+    (PreprocessSettings(max_edge=768, quality=80), 80),
+    (PreprocessSettings(max_edge=512, quality=70), 60),
+    (PreprocessSettings(max_edge=384, quality=60), 40),
+]
+
+
+class QualityController:
+    """Walks a ladder of ``(PreprocessSettings, max_tokens)`` to hold a latency target.
+
+    ``record`` takes the end-to-end latency of each completed request. Once
+    ``min_samples`` have arrived at the current level, the window's
+    ``percentile`` latency is compared with ``target``: above it the
+    controller steps one level down; below ``headroom * target`` it steps
+    one level back up. The window is cleared on every step so each level
+    is judged only on its own requests. Thread-safe.
+    """
+
+    def __init__(self, ladder=DEFAULT_LADDER, target=2.0, percentile=0.9, window=20, min_samples=5, headroom=0.6):
+        if not ladder:
+            raise ValueError("ladder must have at least one level")
+        self.ladder = list(ladder)
+        self.target = target
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.level = 0
+        self.steps_down = 0
+        self.steps_up = 0
+        self.changed_at = time.monotonic()
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        """``(settings, max_tokens)`` to use for the next request."""
+        return self.ladder[self.level]
+
+    def _observed(self):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def record(self, seconds):
+        """Add one latency sample; returns the new level if it changed, else None."""
+        with self._lock:
+            self._samples.append(seconds)
+            if len(self._samples) < self.min_samples:
+                return None
+            observed = self._observed()
+            if observed > self.target and self.level < len(self.ladder) - 1:
+                self.level += 1
+                self.steps_down += 1
+            elif observed < self.target * self.headroom and self.level > 0:
+                self.level -= 1
+                self.steps_up += 1
+            else:
+                return None
+            self._samples.clear()
+            self.changed_at = time.monotonic()
+            return self.level
+
+    def stats(self):
+        with self._lock:
+            observed = self._observed()
+            settings, max_tokens = self.current
+            return {
+                "level": self.level,
+                "levels": len(self.ladder),
+                "preprocess": settings.describe(),
+                "max_tokens": max_tokens,
+                "target_ms": self.target * 1000,
+                f"p{round(self.percentile * 100)}_ms": round(observed * 1000, 1) if observed is not None else None,
+                "samples": len(self._samples),
+                "steps_down": self.steps_down,
+                "steps_up": self.steps_up,
+                "since_change_s": round(time.monotonic() - self.changed_at, 1),
+            }
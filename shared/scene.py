@@ -0,0 +1,15 @@
+import cv2
+import numpy as np
+
+SIGNATURE_SIZE = (64, 48)
+
+
+def scene_signature(frame, size=SIGNATURE_SIZE):
+    """Small grayscale float32 copy of a BGR frame used for change detection."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def scene_change(a, b):
+    """Mean absolute difference between two signatures, as a percentage of full scale."""
+    return float(np.abs(a - b).mean()) * 100.0 / 255.0